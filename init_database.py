@@ -13,11 +13,19 @@ Opciones:
 """
 
 import os
+import re
 import sys
 import mysql.connector
+from mysql.connector import errorcode
 from dotenv import load_dotenv
 from pathlib import Path
 
+# Índices recomendados (lista compartida con la verificación del pipeline)
+try:
+    from app.utils import RECOMMENDED_INDEXES
+except ImportError:
+    from utils import RECOMMENDED_INDEXES
+
 # Cargar variables de entorno
 load_dotenv()
 
@@ -27,6 +35,21 @@ DB_USER = os.getenv('DB_USER')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_NAME = os.getenv('DB_NAME')
 
+# Tokens relevantes para separar statements SQL: literales (se saltan completos),
+# comentarios (se descartan) y ';' de nivel superior (separa statements)
+_SQL_TOKEN_RE = re.compile(r"""
+      '(?:[^'\\]|\\.|'')*'        # 'texto' (con \' o '' escapados)
+    | "(?:[^"\\]|\\.|"")*"        # "texto"
+    | `(?:[^`]|``)*`              # `identificador`
+    | --(?!\S)[^\n]*              # -- comentario de línea
+    | \#[^\n]*                    # # comentario de línea
+    | /\*.*?\*/                   # /* comentario de bloque */
+    | ;
+""", re.VERBOSE | re.DOTALL)
+
+# Tablas que el script puede inspeccionar (SHOW INDEX no admite parámetros)
+KNOWN_TABLES = frozenset({'wp_posts', 'wp_postmeta', 'wp_product_sync_tracking'})
+
 def print_header(text):
     """Imprime un encabezado formateado."""
     print(f"\n{'=' * 80}")
@@ -70,19 +93,62 @@ def check_connection():
         print_error(f"Error de conexión: {e}")
         return None
 
-def check_table_exists(cursor, table_name):
-    """Verifica si una tabla existe."""
+def check_stats_on_metadata(cursor):
+    """
+    Verifica innodb_stats_on_metadata.
+    
+    Si está activo, cada consulta a information_schema recalcula estadísticas
+    de InnoDB y se vuelve muy lenta. Es una variable solo GLOBAL (no admite
+    SET SESSION), por lo que solo se informa cómo desactivarla.
+    """
+    try:
+        cursor.execute("SELECT @@GLOBAL.innodb_stats_on_metadata")
+        row = cursor.fetchone()
+    except mysql.connector.Error:
+        return  # Variable no disponible en este servidor
+    
+    if row and str(row[0]) in ('1', 'ON'):
+        print_info("innodb_stats_on_metadata=ON: las consultas a information_schema serán lentas")
+        print_info("Recomendado: SET GLOBAL innodb_stats_on_metadata = 0")
+
+def ensure_indexes(conn):
+    """Crea los índices recomendados que aún no existan."""
+    cursor = conn.cursor()
+    
+    for table_name, index_name, columns in RECOMMENDED_INDEXES:
+        try:
+            cursor.execute(f"CREATE INDEX {index_name} ON {table_name} ({columns})")
+            print_success(f"Índice '{index_name}' creado en {table_name}")
+        except mysql.connector.Error as e:
+            if e.errno == errorcode.ER_DUP_KEYNAME:
+                print_info(f"Índice '{index_name}' ya existe en {table_name}")
+            else:
+                print_error(f"Error creando índice '{index_name}' en {table_name}: {e}")
+    
+    cursor.close()
+
+def get_existing_tables(cursor, table_names):
+    """Retorna el subconjunto de tablas que existen, en una sola consulta."""
+    placeholders = ', '.join(['%s'] * len(table_names))
     cursor.execute(f"""
-        SELECT COUNT(*) 
+        SELECT TABLE_NAME 
         FROM information_schema.TABLES 
         WHERE TABLE_SCHEMA = DATABASE() 
-        AND TABLE_NAME = '{table_name}'
-    """)
-    return cursor.fetchone()[0] > 0
+        AND TABLE_NAME IN ({placeholders})
+    """, tuple(table_names))
+    # Algunas versiones del conector retornan bytes para columnas de information_schema
+    return {
+        name.decode() if isinstance(name, (bytes, bytearray)) else name
+        for (name,) in cursor.fetchall()
+    }
+
+def check_table_exists(cursor, table_name):
+    """Verifica si una tabla existe."""
+    return table_name in get_existing_tables(cursor, [table_name])
 
 def get_table_info(cursor, table_name):
     """Obtiene información detallada de una tabla."""
-    cursor.execute(f"""
+    cursor.execute("""
         SELECT 
             TABLE_NAME,
             ENGINE,
@@ -94,12 +160,15 @@ def get_table_info(cursor, table_name):
             INDEX_LENGTH
         FROM information_schema.TABLES 
         WHERE TABLE_SCHEMA = DATABASE() 
-        AND TABLE_NAME = '{table_name}'
-    """)
+        AND TABLE_NAME = %s
+    """, (table_name,))
     return cursor.fetchone()
 
 def get_table_indexes(cursor, table_name):
     """Obtiene lista de índices de una tabla."""
+    # El identificador no se puede parametrizar: solo se aceptan tablas conocidas
+    if table_name not in KNOWN_TABLES:
+        raise ValueError(f"Tabla no permitida: {table_name}")
     cursor.execute(f"SHOW INDEX FROM {table_name}")
     indexes = {}
     for row in cursor.fetchall():
@@ -113,7 +182,10 @@ def check_database_status(conn):
     """Verifica el estado actual de la base de datos."""
     print_header("Estado Actual de la Base de Datos")
     
+    # Cursor normal: MySQL no admite SHOW INDEX como sentencia preparada
+    # (ER_UNSUPPORTED_PS) y estas consultas se ejecutan una sola vez
     cursor = conn.cursor()
+    check_stats_on_metadata(cursor)
     
     # Verificar wp_product_sync_tracking
     table_name = 'wp_product_sync_tracking'
@@ -160,6 +232,42 @@ def check_database_status(conn):
     cursor.close()
     return True
 
+def split_sql_statements(sql_content):
+    """
+    Separa un script SQL en statements recorriéndolo una sola vez.
+    
+    A diferencia de split(';'), respeta ';' dentro de literales y comentarios.
+    Los comentarios se eliminan del resultado, salvo los ejecutables de
+    MySQL (/*! ... */, p. ej. en dumps de mysqldump) y los hints de
+    optimizador (/*+ ... */), que forman parte del statement.
+    """
+    statements = []
+    parts = []
+    pos = 0
+    
+    for match in _SQL_TOKEN_RE.finditer(sql_content):
+        token = match.group()
+        if token == ';':
+            parts.append(sql_content[pos:match.start()])
+            statement = ''.join(parts).strip()
+            if statement:
+                statements.append(statement)
+            parts = []
+            pos = match.end()
+        elif token[0] in '-#/' and not token.startswith(('/*!', '/*+')):
+            # Comentario: se reemplaza por un espacio
+            parts.append(sql_content[pos:match.start()])
+            parts.append(' ')
+            pos = match.end()
+        # Literales, identificadores y comentarios ejecutables se conservan tal cual
+    
+    parts.append(sql_content[pos:])
+    statement = ''.join(parts).strip()
+    if statement:
+        statements.append(statement)
+    
+    return statements
+
 def run_initialization(conn):
     """Ejecuta el script de inicialización SQL."""
     print_header("Ejecutando Script de Inicialización")
@@ -177,17 +285,13 @@ def run_initialization(conn):
         with open(sql_file, 'r', encoding='utf-8') as f:
             sql_content = f.read()
         
-        # Separar statements (simple split por ;)
-        statements = [s.strip() for s in sql_content.split(';') if s.strip() and not s.strip().startswith('/*')]
+        # Separar statements (respetando literales y comentarios)
+        statements = split_sql_statements(sql_content)
         
         cursor = conn.cursor()
         executed = 0
         
         for statement in statements:
-            # Ignorar comentarios
-            if statement.startswith('--'):
-                continue
-            
             try:
                 cursor.execute(statement)
                 executed += 1
@@ -200,6 +304,8 @@ def run_initialization(conn):
         conn.commit()
         print_success(f"Ejecutados {executed} statements SQL")
         cursor.close()
+        
+        ensure_indexes(conn)
         return True
         
     except Exception as e:
@@ -219,8 +325,10 @@ def verify_required_tables(conn):
     cursor = conn.cursor()
     all_exist = True
     
+    existing_tables = get_existing_tables(cursor, list(required_tables))
+    
     for table_name, description in required_tables.items():
-        if check_table_exists(cursor, table_name):
+        if table_name in existing_tables:
             print_success(f"{table_name}: {description}")
         else:
             print_error(f"{table_name}: {description} - NO EXISTE")
@@ -260,6 +368,7 @@ def main():
             return 1
     else:
         print_info("Base de datos ya está inicializada")
+        ensure_indexes(conn)
     
     # Verificación final
     if verify_required_tables(conn):
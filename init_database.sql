@@ -13,5 +13,6 @@ CREATE TABLE IF NOT EXISTS wp_product_sync_tracking (
   created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (id),
-  UNIQUE KEY idx_product_sku (product_id, sku)
+  UNIQUE KEY idx_product_sku (product_id, sku),
+  KEY idx_sync_status_pid (sync_status, product_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -12,37 +12,55 @@
 # ============================================================================
 
 import os
+import re
 import sys
 import argparse
 import logging
-import json
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from collections import namedtuple
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from typing import List, Dict, Tuple, Optional, Iterator
 from dotenv import load_dotenv
 
 # Importar utilidades del framework
 try:
     from app.utils import (
         setup_logging,
+        install_shutdown_handler,
         retry_with_backoff,
+        parse_retry_after,
         ValidationStatus,
         BatchProcessor,
-        PipelineStats
+        ThreadSafeQueue,
+        PipelineStats,
+        RECOMMENDED_INDEXES,
+        CHECK_ONLY_INDEXES
     )
 except ImportError:
     from utils import (
         setup_logging,
+        install_shutdown_handler,
         retry_with_backoff,
+        parse_retry_after,
         ValidationStatus,
         BatchProcessor,
-        PipelineStats
+        ThreadSafeQueue,
+        PipelineStats,
+        RECOMMENDED_INDEXES,
+        CHECK_ONLY_INDEXES
     )
 
 # APIs externas
+import orjson
 import mysql.connector
+import mysql.connector.pooling
 from mysql.connector import Error
-
-# Los imports de Google Merchant API se mueven dentro de las funciones que los requieren
+from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import AuthorizedSession, Request
 
 # ============================================================================
 # CONFIGURACIÓN GLOBAL
@@ -60,58 +78,190 @@ MERCHANT_ID = os.getenv('MERCHANT_ID')
 STORE_CODE = os.getenv('STORE_CODE', 'MI-TIENDA-001')
 SERVICE_ACCOUNT_FILE = os.getenv('SERVICE_ACCOUNT_FILE_PATH', '/home/devlia/app_pipeline/service-account.json')
 
+# Endpoint REST de custombatch de Content API v2.1
+CONTENT_API_BATCH_URL = 'https://shoppingcontent.googleapis.com/content/v2.1/products/batch'
+
+# Entries por custombatch de eliminación (máximo permitido por la API)
+DELETE_BATCH_SIZE = 1000
+
 # Tracking de modificaciones
 LAST_SYNC_FILE = os.getenv('LAST_SYNC_FILE', '/home/devlia/app_pipeline/.last_sync_timestamp.json')
 
+# Caché del stock local ya procesado (se invalida cuando cambia el JSON)
+LOCAL_STOCK_CACHE = os.getenv('LOCAL_STOCK_CACHE', '/home/devlia/app_pipeline/.local_stock_cache.pkl')
+
+# Pool de conexiones MySQL
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+
+# Lotes leídos de la BD que pueden esperar envío (productor → consumidor)
+UPLOAD_QUEUE_SIZE = 4
+
+# Filas pedidas al servidor por cada fetchmany en cursores sin buffer
+FETCH_SIZE = 5000
+
+# Pares (product_id, sku) por UPDATE al marcar eliminados: acota el tamaño
+# del statement por debajo de max_allowed_packet
+DELETE_MARK_CHUNK = 1000
+
+# Hilos que envían custombatch a Google en paralelo
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '8'))
+
 # Logger global (se inicializa en main())
 logger: Optional[logging.Logger] = None
 
+# Pools de conexiones globales por modo de autocommit (se crean en main() o
+# en el primer uso): False para escrituras transaccionales, True para lecturas
+_POOLS: Dict[bool, mysql.connector.pooling.MySQLConnectionPool] = {}
+
+# Caché en proceso del timestamp de última sync (_UNSET = aún no leído)
+_UNSET = object()
+_last_sync_cache = _UNSET
+
+# Estado por hilo de envío (sesión HTTP propia, ver _thread_session())
+_thread_local = threading.local()
+
+
+# ============================================================================
+# POOL DE CONEXIONES MYSQL
+# ============================================================================
+
+def init_db_pool(autocommit: bool = False) -> mysql.connector.pooling.MySQLConnectionPool:
+    """
+    Crea (una sola vez por modo) el pool de conexiones MySQL del pipeline.
+    
+    El autocommit se fija en la configuración del pool, así que el pool lo
+    reaplica cada vez que una conexión se recicla.
+    
+    Args:
+        autocommit: True para el pool de lecturas (sin transacción abierta);
+                    False para el de escrituras con conn.commit() explícito
+    
+    Returns:
+        Pool de conexiones
+    """
+    pool = _POOLS.get(autocommit)
+    if pool is None:
+        pool = _POOLS[autocommit] = mysql.connector.pooling.MySQLConnectionPool(
+            pool_name='merchant_ro' if autocommit else 'merchant',
+            pool_size=DB_POOL_SIZE,
+            host=DB_HOST,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            database=DB_NAME,
+            autocommit=autocommit,
+            # Extensión C de mysql-connector (decodificación de filas en C)
+            use_pure=False,
+            # READ COMMITTED: cada lectura ve datos recientes sin mantener
+            # una vista consistente abierta (se reaplica al reciclar la conexión)
+            init_command="SET SESSION TRANSACTION ISOLATION LEVEL READ COMMITTED"
+        )
+    return pool
+
+
+def _get_conn(autocommit: bool = False):
+    """
+    Obtiene una conexión del pool. conn.close() la regresa al pool.
+    
+    Args:
+        autocommit: True para helpers de solo lectura (sin transacción abierta);
+                    False para escrituras que hacen conn.commit() explícito
+    
+    Returns:
+        Conexión MySQL del pool
+    """
+    # Un pool por modo: PooledMySQLConnection no reenvía asignaciones, así que
+    # conn.autocommit = True solo crearía un atributo en la envoltura
+    return init_db_pool(autocommit).get_connection()
+
+
+def _iter_rows(cursor, size: int = FETCH_SIZE) -> Iterator[tuple]:
+    """
+    Recorre el resultado de un cursor sin buffer por bloques de fetchmany.
+    
+    Args:
+        cursor: Cursor con una consulta ya ejecutada
+        size: Filas por bloque
+    
+    Yields:
+        Cada fila del resultado
+    """
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
 # ============================================================================
 # TRACKING DE MODIFICACIONES
 # ============================================================================
 
-def get_last_sync_timestamp() -> Optional[str]:
+def get_sync_checkpoint() -> Optional[Tuple[str, int]]:
     """
-    Obtiene el timestamp de la última sincronización exitosa.
+    Obtiene el checkpoint de la última sincronización exitosa: el par
+    (post_modified, ID) del último producto procesado.
+    
+    El ID desempata productos con el mismo post_modified, de modo que el
+    filtro incremental no repite ni omite productos del mismo segundo.
+    
+    El archivo se lee una sola vez por proceso; las llamadas siguientes
+    retornan el valor en caché (actualizado por save_last_sync_timestamp).
     
     Returns:
-        Timestamp en formato 'YYYY-MM-DD HH:MM:SS' o None si no existe
+        Tupla ('YYYY-MM-DD HH:MM:SS', last_id) o None si no existe
     """
+    global _last_sync_cache
+    if _last_sync_cache is not _UNSET:
+        return _last_sync_cache
+    
     if not os.path.exists(LAST_SYNC_FILE):
         logger.info("No existe historial de sincronización (primera ejecución)")
+        _last_sync_cache = None
         return None
     
     try:
-        with open(LAST_SYNC_FILE, 'r') as f:
-            data = json.load(f)
+        with open(LAST_SYNC_FILE, 'rb') as f:
+            data = orjson.loads(f.read())
             timestamp = data.get('last_sync')
-            if timestamp:
-                logger.info(f"Última sincronización: {timestamp}")
-            return timestamp
-    except (json.JSONDecodeError, IOError) as e:
+            if not timestamp:
+                _last_sync_cache = None
+                return None
+            # Archivos anteriores solo guardaban el timestamp (last_id = 0)
+            checkpoint = (timestamp, int(data.get('last_id') or 0))
+            logger.info(f"Última sincronización: {timestamp} (ID {checkpoint[1]})")
+            _last_sync_cache = checkpoint
+            return checkpoint
+    except (orjson.JSONDecodeError, IOError) as e:
         logger.warning(f"Error leyendo timestamp de última sync: {e}")
         return None
 
 
-def save_last_sync_timestamp(timestamp: str = None):
+def save_last_sync_timestamp(timestamp: str = None, last_id: int = 0):
     """
-    Guarda el timestamp de la sincronización exitosa.
+    Guarda el checkpoint de la sincronización exitosa.
     
     Args:
-        timestamp: Timestamp en formato 'YYYY-MM-DD HH:MM:SS' 
-                   (default: timestamp actual)
+        timestamp: post_modified del último producto procesado, en formato
+                   'YYYY-MM-DD HH:MM:SS' (default: timestamp actual)
+        last_id: ID del último producto procesado con ese post_modified
     """
+    global _last_sync_cache
     if timestamp is None:
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
     try:
         data = {
             'last_sync': timestamp,
+            'last_id': last_id,
             'updated_at': datetime.now().isoformat()
         }
-        with open(LAST_SYNC_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
-        logger.info(f"✓ Timestamp de sincronización guardado: {timestamp}")
+        # Escritura atómica: un fallo a mitad de escritura no deja el archivo truncado
+        tmp_file = LAST_SYNC_FILE + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        os.replace(tmp_file, LAST_SYNC_FILE)
+        _last_sync_cache = (timestamp, last_id)
+        logger.info(f"✓ Timestamp de sincronización guardado: {timestamp} (ID {last_id})")
     except IOError as e:
         logger.error(f"Error guardando timestamp de sincronización: {e}")
 
@@ -120,12 +270,162 @@ def save_last_sync_timestamp(timestamp: str = None):
 # TRACKING DE PRODUCTOS (Tabla wp_product_sync_tracking)
 # ============================================================================
 
-def get_products_needing_sync(force_full: bool = False) -> Tuple[List[Dict], List[Dict]]:
+# Registro compacto de producto: las columnas de las consultas de productos se
+# seleccionan en este mismo orden, de modo que cada fila se convierte directo.
+# price llega como Decimal (DECIMAL en SQL): sin floats en el manejo de dinero
+Product = namedtuple('Product', [
+    'id', 'name', 'sku', 'price', 'catalog_visibility',
+    'stock_quantity', 'stock_status', 'image_url', 'last_modified'
+])
+
+# Consultas de productos: texto constante a nivel de módulo, armado una sola
+# vez por (modo, canal). Se ejecutan con un cursor normal: cada consulta corre
+# una vez por canal y ejecución, así que prepararla solo agregaría el ida y
+# vuelta de COM_STMT_PREPARE/CLOSE
+
+# Modo FULL: Obtener TODOS los productos publicados
+_Q_FULL = """
+    SELECT 
+        p.ID as product_id,
+        p.post_title as name,
+        COALESCE(meta.sku, '') as sku,
+        CAST(COALESCE(meta.price, '0') AS DECIMAL(19, 4)) as price,
+        CASE 
+            WHEN vt.term_id IS NOT NULL THEN 'hidden'
+            ELSE 'visible'
+        END as catalog_visibility,
+        CAST(COALESCE(meta.stock_quantity, '0') AS SIGNED) as stock_quantity,
+        COALESCE(meta.stock_status, 'instock') as stock_status,
+        COALESCE(meta.image_url, '') as image_url,
+        p.post_modified as last_modified
+    FROM wp_posts p
+    -- Metadatos pivotados: un solo recorrido de wp_postmeta en lugar de 5 self-joins
+    LEFT JOIN (
+        SELECT 
+            post_id,
+            MAX(CASE WHEN meta_key = '_sku' THEN meta_value END) as sku,
+            MAX(CASE WHEN meta_key = '_price' THEN meta_value END) as price,
+            MAX(CASE WHEN meta_key = '_stock_quantity' THEN meta_value END) as stock_quantity,
+            MAX(CASE WHEN meta_key = '_stock_status' THEN meta_value END) as stock_status,
+            MAX(CASE WHEN meta_key = '_product_image_url' THEN meta_value END) as image_url
+        FROM wp_postmeta
+        WHERE meta_key IN ('_sku', '_price', '_stock_quantity', '_stock_status', '_product_image_url')
+        GROUP BY post_id
+    ) meta ON meta.post_id = p.ID
+    -- Visibilidad: solo une la relación con el término exclude-from-catalog (máx. 1 fila por producto)
+    LEFT JOIN (
+        wp_term_relationships vtr
+        JOIN wp_term_taxonomy vtt ON (vtt.term_taxonomy_id = vtr.term_taxonomy_id AND vtt.taxonomy = 'product_visibility')
+        JOIN wp_terms vt ON (vt.term_id = vtt.term_id AND vt.slug = 'exclude-from-catalog')
+    ) ON vtr.object_id = p.ID
+    WHERE p.post_type = 'product' 
+      AND p.post_status = 'publish'
+      AND meta.sku IS NOT NULL
+      -- Validación en SQL: sin título o sin precio positivo no se envía.
+      -- REGEXP (no TRIM, que solo quita espacios) equivale al .strip() de validate_product
+      AND p.post_title REGEXP '[^[:space:]]'
+      AND CAST(COALESCE(meta.price, '0') AS DECIMAL(19, 4)) > 0
+      AND {visibility_filter}
+    ORDER BY p.ID ASC
+"""
+
+# Modo INCREMENTAL: Solo productos que necesitan sincronización
+# - Productos nuevos (LEFT JOIN donde tracking.id IS NULL)
+# - Productos modificados (post_modified > last_sent_at)
+# - Productos con errores (sync_status = 'failed' y error_count < 5)
+# Nuevos y modificados se acotan además al checkpoint (post_modified, ID) de
+# la última sync (3 parámetros); los fallidos se reintentan sin importar el
+# checkpoint
+_Q_INCREMENTAL = """
+    SELECT 
+        p.ID as product_id,
+        p.post_title as name,
+        COALESCE(meta.sku, '') as sku,
+        CAST(COALESCE(meta.price, '0') AS DECIMAL(19, 4)) as price,
+        CASE 
+            WHEN vt.term_id IS NOT NULL THEN 'hidden'
+            ELSE 'visible'
+        END as catalog_visibility,
+        CAST(COALESCE(meta.stock_quantity, '0') AS SIGNED) as stock_quantity,
+        COALESCE(meta.stock_status, 'instock') as stock_status,
+        COALESCE(meta.image_url, '') as image_url,
+        p.post_modified as last_modified
+    FROM wp_posts p
+    -- Metadatos pivotados: un solo recorrido de wp_postmeta en lugar de 5 self-joins
+    LEFT JOIN (
+        SELECT 
+            post_id,
+            MAX(CASE WHEN meta_key = '_sku' THEN meta_value END) as sku,
+            MAX(CASE WHEN meta_key = '_price' THEN meta_value END) as price,
+            MAX(CASE WHEN meta_key = '_stock_quantity' THEN meta_value END) as stock_quantity,
+            MAX(CASE WHEN meta_key = '_stock_status' THEN meta_value END) as stock_status,
+            MAX(CASE WHEN meta_key = '_product_image_url' THEN meta_value END) as image_url
+        FROM wp_postmeta
+        WHERE meta_key IN ('_sku', '_price', '_stock_quantity', '_stock_status', '_product_image_url')
+        GROUP BY post_id
+    ) meta ON meta.post_id = p.ID
+    -- Visibilidad: solo une la relación con el término exclude-from-catalog (máx. 1 fila por producto)
+    LEFT JOIN (
+        wp_term_relationships vtr
+        JOIN wp_term_taxonomy vtt ON (vtt.term_taxonomy_id = vtr.term_taxonomy_id AND vtt.taxonomy = 'product_visibility')
+        JOIN wp_terms vt ON (vt.term_id = vtt.term_id AND vt.slug = 'exclude-from-catalog')
+    ) ON vtr.object_id = p.ID
+    LEFT JOIN wp_product_sync_tracking t ON (p.ID = t.product_id AND meta.sku = t.sku)
+    WHERE p.post_type = 'product' 
+      AND p.post_status = 'publish'
+      AND meta.sku IS NOT NULL
+      -- Validación en SQL: sin título o sin precio positivo no se envía.
+      -- REGEXP (no TRIM, que solo quita espacios) equivale al .strip() de validate_product
+      AND p.post_title REGEXP '[^[:space:]]'
+      AND CAST(COALESCE(meta.price, '0') AS DECIMAL(19, 4)) > 0
+      AND {visibility_filter}
+      AND (
+          (t.sync_status = 'failed' AND t.error_count < 5)  -- Error pero aún reintentable
+          OR (
+              (
+                  t.id IS NULL  -- Producto nuevo (no está en tracking)
+                  OR p.post_modified > t.last_sent_at  -- Producto modificado
+              )
+              -- Keyset: posterior al checkpoint, sin repetir ni omitir productos del mismo segundo
+              AND (p.post_modified > %s OR (p.post_modified = %s AND p.ID > %s))
+          )
+      )
+    -- Mismo orden que el keyset (post_modified, ID): el checkpoint sigue el recorrido
+    ORDER BY p.post_modified ASC, p.ID ASC
+"""
+
+# Cada canal tiene su propia consulta: la separación online/local la hace MySQL
+# - online: productos sin el término exclude-from-catalog
+# - local: productos ocultos del catálogo (exclude-from-catalog)
+_VISIBILITY_FILTER = {
+    'online': 'vt.term_id IS NULL',
+    'local': 'vt.term_id IS NOT NULL',
+}
+# Checkpoint neutro (mínimo de DATETIME) para la primera ejecución incremental
+_NO_CHECKPOINT = ('1000-01-01 00:00:00', 0)
+
+_PRODUCT_QUERIES = {
+    (force_full, channel): query.format(visibility_filter=visibility_filter)
+    for force_full, query in ((True, _Q_FULL), (False, _Q_INCREMENTAL))
+    for channel, visibility_filter in _VISIBILITY_FILTER.items()
+}
+
+
+def iter_products_needing_sync(force_full: bool = False, channel: str = 'online',
+                               since: Optional[Tuple[str, int]] = None) -> Iterator[Product]:
     """
-    Obtiene productos que necesitan sincronización basándose en la tabla de tracking.
+    Genera, en streaming, los productos de un canal que necesitan
+    sincronización basándose en la tabla de tracking.
+    
+    Usa un cursor sin buffer: cada producto se entrega en cuanto llega del
+    servidor, sin materializar el resultado completo en memoria, de modo que
+    el envío a Google puede empezar antes de terminar la consulta.
     
     Args:
         force_full: Si es True, ignora tracking y retorna todos los productos
+        channel: 'online' (visibles) o 'local' (ocultos del catálogo)
+        since: Checkpoint (post_modified, ID) de la última sync; acota nuevos
+               y modificados en modo incremental (None = sin checkpoint)
     
     Detecta 3 casos (si force_full=False):
     1. Productos nuevos (no están en tracking)
@@ -134,147 +434,79 @@ def get_products_needing_sync(force_full: bool = False) -> Tuple[List[Dict], Lis
     
     Si force_full=True: Retorna todos los productos publicados
     
-    Returns:
-        Tupla (online_products, local_products) que necesitan sync
+    Yields:
+        Product del canal solicitado
+    
+    Raises:
+        Error: Si falla la consulta (el llamador decide si guardar checkpoint)
     """
+    conn = None
     try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        cursor = conn.cursor(dictionary=True)
+        conn = _get_conn(autocommit=True)  # Solo lectura
+        cursor = conn.cursor(buffered=False)
         
+        query = _PRODUCT_QUERIES[(force_full, channel)]
         if force_full:
-            # Modo FULL: Obtener TODOS los productos publicados
-            query = """
-            SELECT 
-                p.ID as product_id,
-                p.post_title as name,
-                p.post_modified as last_modified,
-                COALESCE(sku_meta.meta_value, '') as sku,
-                COALESCE(price_meta.meta_value, '0') as price,
-                CASE 
-                    WHEN EXISTS (
-                        SELECT 1 
-                        FROM wp_term_relationships tr2
-                        JOIN wp_term_taxonomy tt2 ON tr2.term_taxonomy_id = tt2.term_taxonomy_id
-                        JOIN wp_terms t2 ON tt2.term_id = t2.term_id
-                        WHERE tr2.object_id = p.ID
-                          AND tt2.taxonomy = 'product_visibility'
-                          AND t2.slug = 'exclude-from-catalog'
-                    ) THEN 'hidden'
-                    ELSE 'visible'
-                END as catalog_visibility,
-                COALESCE(stock_meta.meta_value, '0') as stock_quantity,
-                COALESCE(status_meta.meta_value, 'instock') as stock_status,
-                COALESCE(image_meta.meta_value, '') as image_url
-            FROM wp_posts p
-            LEFT JOIN wp_postmeta sku_meta ON (p.ID = sku_meta.post_id AND sku_meta.meta_key = '_sku')
-            LEFT JOIN wp_postmeta price_meta ON (p.ID = price_meta.post_id AND price_meta.meta_key = '_price')
-            LEFT JOIN wp_postmeta stock_meta ON (p.ID = stock_meta.post_id AND stock_meta.meta_key = '_stock_quantity')
-            LEFT JOIN wp_postmeta status_meta ON (p.ID = status_meta.post_id AND status_meta.meta_key = '_stock_status')
-            LEFT JOIN wp_postmeta image_meta ON (p.ID = image_meta.post_id AND image_meta.meta_key = '_product_image_url')
-            WHERE p.post_type = 'product' 
-              AND p.post_status = 'publish'
-              AND sku_meta.meta_value IS NOT NULL
-            ORDER BY p.ID ASC;
-            """
+            cursor.execute(query)
         else:
-            # Modo INCREMENTAL: Solo productos que necesitan sincronización
-            # - Productos nuevos (LEFT JOIN donde tracking.id IS NULL)
-            # - Productos modificados (post_modified > last_sent_at)
-            # - Productos con errores (sync_status = 'failed' y error_count < 5)
-            query = """
-            SELECT 
-                p.ID as product_id,
-                p.post_title as name,
-                p.post_modified as last_modified,
-                COALESCE(sku_meta.meta_value, '') as sku,
-                COALESCE(price_meta.meta_value, '0') as price,
-                CASE 
-                    WHEN EXISTS (
-                        SELECT 1 
-                        FROM wp_term_relationships tr2
-                        JOIN wp_term_taxonomy tt2 ON tr2.term_taxonomy_id = tt2.term_taxonomy_id
-                        JOIN wp_terms t2 ON tt2.term_id = t2.term_id
-                        WHERE tr2.object_id = p.ID
-                          AND tt2.taxonomy = 'product_visibility'
-                          AND t2.slug = 'exclude-from-catalog'
-                    ) THEN 'hidden'
-                    ELSE 'visible'
-                END as catalog_visibility,
-                COALESCE(stock_meta.meta_value, '0') as stock_quantity,
-                COALESCE(status_meta.meta_value, 'instock') as stock_status,
-                COALESCE(image_meta.meta_value, '') as image_url,
-                t.last_sent_at,
-                t.sync_status,
-                t.error_count
-            FROM wp_posts p
-            LEFT JOIN wp_postmeta sku_meta ON (p.ID = sku_meta.post_id AND sku_meta.meta_key = '_sku')
-            LEFT JOIN wp_postmeta price_meta ON (p.ID = price_meta.post_id AND price_meta.meta_key = '_price')
-            LEFT JOIN wp_postmeta stock_meta ON (p.ID = stock_meta.post_id AND stock_meta.meta_key = '_stock_quantity')
-            LEFT JOIN wp_postmeta status_meta ON (p.ID = status_meta.post_id AND status_meta.meta_key = '_stock_status')
-            LEFT JOIN wp_postmeta image_meta ON (p.ID = image_meta.post_id AND image_meta.meta_key = '_product_image_url')
-            LEFT JOIN wp_product_sync_tracking t ON (p.ID = t.product_id AND sku_meta.meta_value = t.sku)
-            WHERE p.post_type = 'product' 
-              AND p.post_status = 'publish'
-              AND sku_meta.meta_value IS NOT NULL
-              AND (
-                  t.id IS NULL  -- Producto nuevo (no está en tracking)
-                  OR p.post_modified > t.last_sent_at  -- Producto modificado
-                  OR (t.sync_status = 'failed' AND t.error_count < 5)  -- Error pero aún reintentable
-              )
-            ORDER BY p.ID ASC;
-            """
+            since_ts, since_id = since or _NO_CHECKPOINT
+            cursor.execute(query, (since_ts, since_ts, since_id))
         
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        
-        # Convertir a formato esperado
-        all_products = []
-        for row in rows:
-            stock_qty = row['stock_quantity'] if row['stock_quantity'] else 0
-            product = {
-                'id': row['product_id'],
-                'name': row['name'],
-                'sku': row['sku'],
-                'price': str(row['price']),
-                'catalog_visibility': row['catalog_visibility'],
-                'stock_quantity': int(stock_qty) if stock_qty else 0,
-                'stock_status': row['stock_status'],
-                'image_url': row['image_url'],
-                'last_modified': row['last_modified']
-            }
-            all_products.append(product)
+        # Las conversiones (precio a texto, stock a entero) ya vienen hechas
+        # desde SQL: cada fila se envuelve tal cual en Product
+        total = 0
+        make_product = Product._make
+        for row in _iter_rows(cursor):
+            total += 1
+            yield make_product(row)
         
         cursor.close()
-        conn.close()
         
-        logger.info(f"✓ Productos que necesitan sync: {len(all_products)}")
+        logger.info(f"✓ Productos {channel} que necesitan sync: {total}")
         
-    except Error as e:
-        logger.error(f"Error obteniendo productos que necesitan sync: {e}")
-        return ([], [])
+    finally:
+        if conn is not None:
+            # Si el consumidor se detuvo antes, descartar filas pendientes
+            if conn.unread_result:
+                conn.consume_results()
+            conn.close()  # Regresa la conexión al pool
+
+
+def produce_product_batches(force_full: bool, channel: str, batch_size: int,
+                            out_queue: ThreadSafeQueue,
+                            since: Optional[Tuple[str, int]] = None,
+                            stats: Optional[PipelineStats] = None):
+    """
+    Productor: lee en streaming los productos de un canal y deja lotes en
+    out_queue mientras el hilo principal envía los anteriores a Google.
     
-    # Categorizar por visibilidad
-    online_products = [
-        p for p in all_products
-        if p.get('catalog_visibility') in ['visible', 'catalog', 'search', '']
-    ]
-    local_products = [
-        p for p in all_products
-        if p.get('catalog_visibility') == 'hidden'
-    ]
+    Siempre termina con mark_finished() para que el consumidor deje de esperar.
     
-    logger.info(f"✓ Total: {len(all_products)} | Online: {len(online_products)} | Locales: {len(local_products)}")
-    return (online_products, local_products)
+    Args:
+        force_full: Si True, ignora tracking
+        channel: 'online' o 'local'
+        batch_size: Tamaño de cada lote
+        out_queue: Cola acotada donde se depositan los lotes
+        since: Checkpoint (post_modified, ID) de la última sync
+        stats: Objeto de estadísticas (registra el error si la lectura falla)
+    """
+    try:
+        # Cada lote es una lista propia: se entrega a otro hilo por la cola
+        products = iter_products_needing_sync(force_full=force_full, channel=channel, since=since)
+        for batch in BatchProcessor.chunks(products, batch_size):
+            if not out_queue.put(batch, timeout=None):
+                break  # El consumidor cerró la cola (error o Ctrl+C)
+    except Exception as e:
+        logger.error(f"Error leyendo productos {channel}: {e}")
+        if stats:
+            stats.add_error()
+    finally:
+        out_queue.mark_finished()
 
 
 def update_sync_tracking(product_id: int, sku: str, channel: str, 
                         success: bool, merchant_product_id: str = None,
-                        error_message: str = None):
+                        error_message: str = None, last_modified: datetime = None):
     """
     Actualiza o crea registro de tracking para un producto.
     
@@ -285,73 +517,80 @@ def update_sync_tracking(product_id: int, sku: str, channel: str,
         success: True si el envío fue exitoso
         merchant_product_id: ID del producto en Google (ej: online:SKU-123)
         error_message: Mensaje de error si success=False
+        last_modified: post_modified del producto tal como se leyó para el envío
+    """
+    update_sync_tracking_bulk([
+        (product_id, sku, channel, success, merchant_product_id, error_message, last_modified)
+    ])
+
+
+def update_sync_tracking_bulk(results: List[Tuple[int, str, str, bool, Optional[str], Optional[str], datetime]]) -> bool:
     """
+    Actualiza o crea registros de tracking para un lote de productos.
+    
+    Usa una sola conexión, un único INSERT multi-fila (con ON DUPLICATE KEY
+    UPDATE para ambos estados) y un único commit. last_modified llega desde
+    la consulta de productos, así que no se vuelve a consultar wp_posts.
+    
+    Args:
+        results: Lista de tuplas (product_id, sku, channel, success,
+                 merchant_product_id, error_message, last_modified)
+    
+    Returns:
+        True si el tracking quedó registrado (o no había filas), False en error
+    """
+    if not results:
+        return True
+    
+    conn = None
     try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
+        conn = _get_conn()
         cursor = conn.cursor()
         
-        # Obtener last_modified actual del producto
-        cursor.execute("""
-            SELECT post_modified FROM wp_posts WHERE ID = %s
-        """, (product_id,))
-        result = cursor.fetchone()
-        
-        if not result:
-            logger.warning(f"Producto ID {product_id} no encontrado en wp_posts")
-            return
-        
-        last_modified = result[0]
-        
-        if success:
-            # Sync exitoso: actualizar o insertar con estado 'synced'
-            query = """
-            INSERT INTO wp_product_sync_tracking 
-                (product_id, sku, channel, last_sent_at, last_modified_at, 
-                 sync_status, merchant_product_id, error_count, last_error)
-            VALUES 
-                (%s, %s, %s, NOW(), %s, 'synced', %s, 0, NULL)
-            ON DUPLICATE KEY UPDATE
-                last_sent_at = NOW(),
-                last_modified_at = %s,
-                sync_status = 'synced',
-                merchant_product_id = %s,
-                error_count = 0,
-                last_error = NULL
-            """
-            cursor.execute(query, (
-                product_id, sku, channel, last_modified, merchant_product_id,
-                last_modified, merchant_product_id
-            ))
-        else:
-            # Sync fallido: incrementar error_count y guardar mensaje
-            query = """
-            INSERT INTO wp_product_sync_tracking 
-                (product_id, sku, channel, last_sent_at, last_modified_at, 
-                 sync_status, merchant_product_id, error_count, last_error)
-            VALUES 
-                (%s, %s, %s, NOW(), %s, 'failed', %s, 1, %s)
-            ON DUPLICATE KEY UPDATE
-                last_modified_at = %s,
-                sync_status = 'failed',
-                error_count = error_count + 1,
-                last_error = %s
-            """
-            cursor.execute(query, (
-                product_id, sku, channel, last_modified, merchant_product_id, error_message,
-                last_modified, error_message
-            ))
+        params = []
+        for (product_id, sku, channel, success, merchant_product_id,
+             error_message, last_modified) in results:
+            if success:
+                params.extend((product_id, sku, channel, last_modified, 'synced',
+                               merchant_product_id, 0, None))
+            else:
+                params.extend((product_id, sku, channel, last_modified, 'failed',
+                               merchant_product_id, 1, error_message))
+        
+        # Un solo INSERT multi-fila para synced y failed, con la lista VALUES
+        # armada aquí (un grupo por producto; el lote ya viene acotado por
+        # --batch) en lugar de depender de que executemany la reescriba:
+        # - synced: marca envío, guarda merchant_product_id y reinicia errores
+        # - failed: conserva último envío y merchant_product_id, incrementa error_count
+        # sync_status se asigna al final para que las condiciones usen el valor nuevo
+        values = ', '.join(['(%s, %s, %s, NOW(), %s, %s, %s, %s, %s)'] * len(results))
+        query = f"""
+        INSERT INTO wp_product_sync_tracking 
+            (product_id, sku, channel, last_sent_at, last_modified_at, 
+             sync_status, merchant_product_id, error_count, last_error)
+        VALUES 
+            {values}
+        ON DUPLICATE KEY UPDATE
+            last_sent_at = IF(VALUES(sync_status) = 'synced', NOW(), last_sent_at),
+            last_modified_at = VALUES(last_modified_at),
+            merchant_product_id = IF(VALUES(sync_status) = 'synced',
+                                     VALUES(merchant_product_id), merchant_product_id),
+            error_count = IF(VALUES(sync_status) = 'synced', 0, error_count + 1),
+            last_error = VALUES(last_error),
+            sync_status = VALUES(sync_status)
+        """
+        cursor.execute(query, params)
         
         conn.commit()
         cursor.close()
-        conn.close()
+        return True
         
     except Error as e:
-        logger.error(f"Error actualizando tracking para SKU {sku}: {e}")
+        logger.error(f"Error actualizando tracking de {len(results)} productos: {e}")
+        return False
+    finally:
+        if conn is not None:
+            conn.close()  # Regresa la conexión al pool
 
 
 def get_deleted_products() -> List[Dict]:
@@ -361,33 +600,32 @@ def get_deleted_products() -> List[Dict]:
     Returns:
         Lista de dicts con: {product_id, sku, channel, merchant_product_id}
     """
+    conn = None
     try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
+        conn = _get_conn(autocommit=True)  # Solo lectura
         cursor = conn.cursor(dictionary=True)
         
-        # LEFT JOIN: productos en tracking pero no en wp_posts (eliminados)
+        # Anti-join: productos en tracking pero no en wp_posts (eliminados).
+        # idx_sync_status_pid acota el recorrido y NOT EXISTS sondea la PK de wp_posts.
+        # merchant_product_id se completa en SQL si el tracking no lo tiene
         query = """
         SELECT 
             t.product_id,
             t.sku,
             t.channel,
-            t.merchant_product_id
+            COALESCE(
+                t.merchant_product_id,
+                IF(t.channel = 'online', CONCAT('online:', t.sku), CONCAT('local:', %s, ':', t.sku))
+            ) as merchant_product_id
         FROM wp_product_sync_tracking t
-        LEFT JOIN wp_posts p ON t.product_id = p.ID
-        WHERE p.ID IS NULL 
-          AND t.sync_status != 'deleted'
+        WHERE t.sync_status <> 'deleted'
+          AND NOT EXISTS (SELECT 1 FROM wp_posts p WHERE p.ID = t.product_id)
         """
         
-        cursor.execute(query)
+        cursor.execute(query, (STORE_CODE,))
         deleted_products = cursor.fetchall()
         
         cursor.close()
-        conn.close()
         
         if deleted_products:
             logger.warning(f"⚠️  Detectados {len(deleted_products)} productos eliminados")
@@ -397,6 +635,9 @@ def get_deleted_products() -> List[Dict]:
     except Error as e:
         logger.error(f"Error detectando productos eliminados: {e}")
         return []
+    finally:
+        if conn is not None:
+            conn.close()  # Regresa la conexión al pool
 
 
 def mark_product_as_deleted(product_id: int, sku: str):
@@ -407,32 +648,48 @@ def mark_product_as_deleted(product_id: int, sku: str):
         product_id: ID del producto
         sku: SKU del producto
     """
+    mark_products_as_deleted_bulk([(product_id, sku)])
+
+
+def mark_products_as_deleted_bulk(items: List[Tuple[int, str]]):
+    """
+    Marca varios productos como 'deleted' en tracking con un UPDATE por
+    cada DELETE_MARK_CHUNK productos y un solo commit.
+    
+    Args:
+        items: Lista de tuplas (product_id, sku)
+    """
+    if not items:
+        return
+    
+    conn = None
     try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
+        conn = _get_conn()
         cursor = conn.cursor()
         
-        query = """
-        UPDATE wp_product_sync_tracking
-        SET sync_status = 'deleted',
-            updated_at = NOW()
-        WHERE product_id = %s AND sku = %s
-        """
-        
-        cursor.execute(query, (product_id, sku))
+        for chunk in BatchProcessor.chunks(items, DELETE_MARK_CHUNK):
+            # WHERE (product_id, sku) IN ((%s, %s), ...) con un par por producto
+            pairs = ', '.join(['(%s, %s)'] * len(chunk))
+            query = f"""
+            UPDATE wp_product_sync_tracking
+            SET sync_status = 'deleted',
+                updated_at = NOW()
+            WHERE (product_id, sku) IN ({pairs})
+            """
+            
+            params = [value for item in chunk for value in item]
+            cursor.execute(query, params)
         conn.commit()
         
         cursor.close()
-        conn.close()
         
-        logger.info(f"✓ Producto {sku} marcado como eliminado en tracking")
+        logger.info(f"✓ {len(items)} productos marcados como eliminados en tracking")
         
     except Error as e:
-        logger.error(f"Error marcando producto {sku} como eliminado: {e}")
+        logger.error(f"Error marcando {len(items)} productos como eliminados: {e}")
+    finally:
+        if conn is not None:
+            conn.close()  # Regresa la conexión al pool
 
 
 # ============================================================================
@@ -468,137 +725,251 @@ def validate_env() -> bool:
     return True
 
 
+# Longitud de prefijo en la definición de un índice: meta_key(191)
+_INDEX_PREFIX_RE = re.compile(r'\(\d+\)')
+
+
+def check_recommended_indexes():
+    """
+    Verifica (una vez, al inicio) que existan los índices recomendados
+    (RECOMMENDED_INDEXES y CHECK_ONLY_INDEXES de utils) y registra un
+    warning con el CREATE INDEX sugerido si falta alguno.
+    
+    Solo observabilidad: no modifica el esquema.
+    """
+    conn = None
+    try:
+        conn = _get_conn(autocommit=True)  # Solo lectura
+        cursor = conn.cursor(dictionary=True)
+        
+        index_columns_by_table = {}
+        for table, index_name, definition in RECOMMENDED_INDEXES + CHECK_ONLY_INDEXES:
+            if table not in index_columns_by_table:
+                # Columnas de cada índice existente, en orden
+                cursor.execute(f"SHOW INDEX FROM {table}")
+                index_columns = {}
+                for row in sorted(cursor.fetchall(), key=lambda r: r['Seq_in_index']):
+                    index_columns.setdefault(row['Key_name'], []).append(row['Column_name'].lower())
+                index_columns_by_table[table] = index_columns
+            
+            # Cubierto si algún índice empieza con las columnas recomendadas
+            # (sin las longitudes de prefijo, p. ej. meta_key(191) → meta_key)
+            columns = [_INDEX_PREFIX_RE.sub('', column).strip() for column in definition.split(',')]
+            wanted = [column.lower() for column in columns]
+            if not any(cols[:len(wanted)] == wanted
+                       for cols in index_columns_by_table[table].values()):
+                logger.warning(
+                    f"⚠️  Falta índice en {table} ({', '.join(columns)}); "
+                    f"recomendado: CREATE INDEX {index_name} ON {table} ({definition})"
+                )
+        
+        cursor.close()
+        
+    except Error as e:
+        logger.warning(f"No se pudieron verificar índices recomendados: {e}")
+    finally:
+        if conn is not None:
+            conn.close()  # Regresa la conexión al pool
+
+
 # ============================================================================
 # LECTURA DE PRODUCTOS - VERSIÓN SQL (sin API REST)
 # ============================================================================
 
-def fetch_products_from_db(debug_mode: bool = False, since_timestamp: Optional[str] = None) -> Tuple[List[Dict], List[Dict]]:
+# Valores de catalog_visibility que se publican en el canal online
+_ONLINE_VISIBILITY = frozenset({'visible', 'catalog', 'search', ''})
+
+
+def iter_products_from_db(debug_mode: bool = False, since_timestamp: Optional[str] = None,
+                          since_id: int = 0) -> Iterator[Product]:
     """
-    Obtiene productos directamente de la BD WordPress.
+    Genera, en streaming, productos directamente de la BD WordPress.
+    
+    Usa un cursor sin buffer leído con fetchmany: el resultado nunca se
+    materializa completo y el consumidor puede procesar (o enviar) productos
+    mientras la consulta sigue llegando.
     
     Args:
         debug_mode: Si True, imprime logs detallados
         since_timestamp: Si se proporciona, solo obtiene productos modificados después de este timestamp
                         Formato: 'YYYY-MM-DD HH:MM:SS'
+        since_id: Desempate del checkpoint: con post_modified == since_timestamp,
+                  solo productos con ID mayor
     
-    Returns:
-        Tupla (online_products, local_products) con dicts
+    Yields:
+        Product con catalog_visibility ya clasificado
     """
+    conn = None
     try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
+        conn = _get_conn(autocommit=True)  # Solo lectura
+        cursor = conn.cursor(buffered=False)
         
-        cursor = conn.cursor(dictionary=True)
-        
-        # Consulta SQL que une posts + postmeta para obtener todos los datos
+        # Consulta SQL: un solo recorrido de wp_postmeta por las 5 meta_keys,
+        # pivotado por post_id y unido una vez a wp_posts
         query = """
         SELECT 
             p.ID as product_id,
             p.post_title as name,
-            p.post_modified as last_modified,
-            COALESCE(sku_meta.meta_value, '') as sku,
-            COALESCE(price_meta.meta_value, '0') as price,
+            m.sku,
+            CAST(COALESCE(m.price, '0') AS DECIMAL(19, 4)) as price,
             CASE 
-                WHEN sku_meta.meta_value LIKE 'PROD-LOC%' THEN 'hidden'
-                WHEN sku_meta.meta_value LIKE 'PROD-ON%' THEN 'visible'
+                WHEN m.sku LIKE 'PROD-LOC%' THEN 'hidden'
+                WHEN m.sku LIKE 'PROD-ON%' THEN 'visible'
                 ELSE 'visible'
             END as catalog_visibility,
-            COALESCE(stock_meta.meta_value, '0') as stock_quantity,
-            COALESCE(status_meta.meta_value, 'instock') as stock_status,
-            COALESCE(image_meta.meta_value, '') as image_url
+            CAST(COALESCE(m.stock_quantity, '0') AS SIGNED) as stock_quantity,
+            COALESCE(m.stock_status, 'instock') as stock_status,
+            COALESCE(m.image_url, '') as image_url,
+            p.post_modified as last_modified
         FROM wp_posts p
-        LEFT JOIN wp_postmeta sku_meta ON (p.ID = sku_meta.post_id AND sku_meta.meta_key = '_sku')
-        LEFT JOIN wp_postmeta price_meta ON (p.ID = price_meta.post_id AND price_meta.meta_key = '_price')
-        LEFT JOIN wp_postmeta stock_meta ON (p.ID = stock_meta.post_id AND stock_meta.meta_key = '_stock_quantity')
-        LEFT JOIN wp_postmeta status_meta ON (p.ID = status_meta.post_id AND status_meta.meta_key = '_stock_status')
-        LEFT JOIN wp_postmeta image_meta ON (p.ID = image_meta.post_id AND image_meta.meta_key = '_product_image_url')
+        JOIN (
+            SELECT 
+                post_id,
+                MAX(CASE WHEN meta_key = '_sku' THEN meta_value END) as sku,
+                MAX(CASE WHEN meta_key = '_price' THEN meta_value END) as price,
+                MAX(CASE WHEN meta_key = '_stock_quantity' THEN meta_value END) as stock_quantity,
+                MAX(CASE WHEN meta_key = '_stock_status' THEN meta_value END) as stock_status,
+                MAX(CASE WHEN meta_key = '_product_image_url' THEN meta_value END) as image_url
+            FROM wp_postmeta
+            WHERE meta_key IN ('_sku', '_price', '_stock_quantity', '_stock_status', '_product_image_url')
+            GROUP BY post_id
+            HAVING sku IS NOT NULL
+        ) m ON m.post_id = p.ID
         WHERE p.post_type = 'product' 
           AND p.post_status = 'publish'
-          AND sku_meta.meta_value IS NOT NULL
+          AND p.post_title REGEXP '[^[:space:]]'
+          AND CAST(COALESCE(m.price, '0') AS DECIMAL(19, 4)) > 0
         """
         
         # Agregar filtro de timestamp si se proporciona
         if since_timestamp:
-            query += " AND p.post_modified > %s"
-            cursor.execute(query + " ORDER BY p.ID ASC;", (since_timestamp,))
+            # Keyset (post_modified, ID): ni repite ni omite productos del mismo segundo
+            query += " AND (p.post_modified > %s OR (p.post_modified = %s AND p.ID > %s))"
+            cursor.execute(
+                query + " ORDER BY p.post_modified ASC, p.ID ASC;",
+                (since_timestamp, since_timestamp, since_id)
+            )
             logger.info(f"🔄 Modo incremental: solo productos modificados después de {since_timestamp}")
         else:
             query += " ORDER BY p.ID ASC;"
             cursor.execute(query)
             logger.info("🔄 Modo completo: procesando todos los productos")
         
-        rows = cursor.fetchall()
-        
-        # Los resultados ya son dicts porque usamos cursor(dictionary=True)
-        all_products = []
-        for row in rows:
-            stock_qty = row['stock_quantity'] if row['stock_quantity'] else 0
-            product = {
-                'id': row['product_id'],
-                'name': row['name'],
-                'sku': row['sku'],
-                'price': str(row['price']),
-                'catalog_visibility': row['catalog_visibility'],  # Ya clasificado por SKU en SQL
-                'stock_quantity': int(stock_qty),
-                'stock_status': row['stock_status'],
-                'image_url': row['image_url']
-            }
-            all_products.append(product)
+        # Tuplas en el orden de columnas de Product; tipos ya convertidos en SQL
+        total = 0
+        make_product = Product._make
+        for row in _iter_rows(cursor):
+            total += 1
+            yield make_product(row)
         
         cursor.close()
-        conn.close()
         
         if debug_mode:
-            logger.debug(f"✓ Consultados {len(all_products)} productos de la BD")
+            logger.debug(f"✓ Consultados {total} productos de la BD")
         
     except Error as e:
         logger.error(f"Error consultando BD para productos: {e}")
-        return ([], [])
+    finally:
+        if conn is not None:
+            # Si el consumidor se detuvo antes, descartar filas pendientes
+            if conn.unread_result:
+                conn.consume_results()
+            conn.close()  # Regresa la conexión al pool
+
+
+def fetch_products_from_db(debug_mode: bool = False, since_timestamp: Optional[str] = None,
+                           since_id: int = 0) -> Tuple[List[Product], List[Product]]:
+    """
+    Obtiene productos directamente de la BD WordPress, separados por canal.
     
-    # Categorizar por visibilidad
-    online_products = [
-        p for p in all_products
-        if p.get('catalog_visibility') in ['visible', 'catalog', 'search', '']
-    ]
-    local_products = [
-        p for p in all_products
-        if p.get('catalog_visibility') == 'hidden'
-    ]
+    Envoltura de iter_products_from_db para quien necesita las listas
+    completas; el pipeline principal consume los generadores directamente.
     
-    logger.info(f"✓ Total: {len(all_products)} | Online: {len(online_products)} | Locales: {len(local_products)}")
+    Args:
+        debug_mode: Si True, imprime logs detallados
+        since_timestamp: Si se proporciona, solo obtiene productos modificados después de este timestamp
+                        Formato: 'YYYY-MM-DD HH:MM:SS'
+    
+    Returns:
+        Tupla (online_products, local_products) con Product
+    """
+    online_products = []
+    local_products = []
+    
+    # Categorizar en una sola pasada con pertenencia a frozenset (O(1)).
+    # Título y precio ya vienen validados desde SQL
+    for p in iter_products_from_db(debug_mode=debug_mode, since_timestamp=since_timestamp,
+                                   since_id=since_id):
+        visibility = p.catalog_visibility
+        if visibility in _ONLINE_VISIBILITY:
+            online_products.append(p)
+        elif visibility == 'hidden':
+            local_products.append(p)
+    
+    total = len(online_products) + len(local_products)
+    logger.info(f"✓ Total: {total} | Online: {len(online_products)} | Locales: {len(local_products)}")
     return (online_products, local_products)
 
 
+@lru_cache(maxsize=1)
+def _load_credentials():
+    """
+    Carga las credenciales de Service Account con el scope de Content API.
+    
+    Se leen una sola vez por proceso: todas las sesiones de envío
+    comparten el mismo objeto (y su token OAuth).
+    
+    Returns:
+        Credenciales de google.oauth2
+    """
+    scopes = [
+        'https://www.googleapis.com/auth/content'
+    ]
+    return Credentials.from_service_account_file(
+        SERVICE_ACCOUNT_FILE,
+        scopes=scopes
+    )
+
+
+def _thread_session():
+    """
+    Retorna la sesión HTTP autorizada del hilo actual (creada en su primer uso).
+    
+    AuthorizedSession (requests) mantiene conexiones keep-alive con Google y
+    renueva el token OAuth solo cuando expira; cada hilo de envío usa la suya.
+    
+    Returns:
+        AuthorizedSession propia del hilo
+    """
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = AuthorizedSession(_load_credentials())
+        _thread_local.session = session
+    return session
+
+
 def init_google_clients():
     """
-    Inicializa Google Content API v2.1 con reintentos.
+    Inicializa el acceso a Google Content API v2.1 con reintentos.
+    
+    Envíos y eliminaciones usan AuthorizedSession (REST custombatch), así que
+    solo se cargan las credenciales y se obtiene el primer token OAuth: una
+    llave inválida o sin permisos falla aquí y no en el primer lote.
     
     Returns:
-        Tupla (service, 200) o (None, 500) en error
+        Tupla (True, credenciales, 200) o None si fallan todos los intentos
     """
     def connect():
         try:
-            from google.oauth2.service_account import Credentials
-            from googleapiclient.discovery import build
-            
-            scopes = [
-                'https://www.googleapis.com/auth/content'
-            ]
-            credentials = Credentials.from_service_account_file(
-                SERVICE_ACCOUNT_FILE,
-                scopes=scopes
-            )
-            service = build('content', 'v2.1', credentials=credentials)
+            credentials = _load_credentials()
+            if not credentials.valid:
+                credentials.refresh(Request())
             logger.info("✓ Google Content API v2.1 inicializado")
-            return (True, service, 200)
+            return (True, credentials, 200)
         except Exception as e:
             logger.error(f"Error al inicializar Google Content API v2.1: {e}")
             return (False, None, 500)
-    return retry_with_backoff(connect, max_retries=5, debug_mode=False)
+    return retry_with_backoff(connect, max_retries=5)
 
 
 # ============================================================================
@@ -610,116 +981,184 @@ def init_google_clients():
 # Ya no necesitamos API REST de WooCommerce, usamos SQL directo
 
 
-def fetch_local_stock_from_json() -> Optional[Dict[str, int]]:
+def _load_stock_cache(cache_key: tuple) -> Optional[Dict]:
+    """
+    Lee el stock local procesado desde la caché si corresponde al JSON actual.
+    
+    Args:
+        cache_key: (formato, ruta, mtime_ns, tamaño) del archivo JSON de stock
+    
+    Returns:
+        Stock procesado en caché o None si no existe, está corrupta o es de otra versión
+    """
+    try:
+        with open(LOCAL_STOCK_CACHE, 'rb') as f:
+            key, first_store_by_sku = pickle.load(f)
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        return None
+    return first_store_by_sku if key == cache_key else None
+
+
+def _save_stock_cache(cache_key: tuple, first_store_by_sku: Dict[str, str]):
+    """
+    Guarda el stock local procesado en la caché (escritura atómica).
+    
+    Args:
+        cache_key: (formato, ruta, mtime_ns, tamaño) del archivo JSON de stock
+        first_store_by_sku: Stock procesado {SKU: store_code}
+    """
+    tmp_file = LOCAL_STOCK_CACHE + '.tmp'
+    try:
+        with open(tmp_file, 'wb') as f:
+            pickle.dump((cache_key, first_store_by_sku), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, LOCAL_STOCK_CACHE)
+    except OSError as e:
+        logger.warning(f"No se pudo guardar caché de stock local: {e}")
+
+
+def fetch_local_stock_from_json() -> Optional[Dict[str, str]]:
     """
     Obtiene stock local desde archivo JSON con reintentos.
     
+    Solo se necesita la primera tienda (en orden del archivo) que tiene cada
+    SKU, así que se arma directamente {SKU: store_code} en una pasada.
+    
+    Si el JSON no cambió (misma ruta, mtime y tamaño) desde la última
+    ejecución, usa el resultado ya procesado de LOCAL_STOCK_CACHE.
+    
     Returns:
-        Diccionario {SKU: stock_quantity} o None si falla
+        Tupla (success, {SKU: store_code}, status) o None si falla
     """
     def get_stock():
         try:
-            import json
-            
             stock_file = os.getenv('LOCAL_STOCK_FILE', '/home/devlia/app_pipeline/local_stock.json')
             if not os.path.exists(stock_file):
                 logger.error(f"Archivo de stock local no encontrado: {stock_file}")
                 return (False, None, 404)
             
-            with open(stock_file, 'r') as f:
-                stock_data = json.load(f)
+            stat = os.stat(stock_file)
+            cache_key = ('first_store', stock_file, stat.st_mtime_ns, stat.st_size)
+            first_store_by_sku = _load_stock_cache(cache_key)
+            if first_store_by_sku is not None:
+                logger.info(f"✓ Stock local cargado desde caché: {len(first_store_by_sku)} SKUs")
+                return (True, first_store_by_sku, 200)
+            
+            with open(stock_file, 'rb') as f:
+                stock_data = orjson.loads(f.read())
             
             # Estructura: {"TIENDA-001": {SKU: qty}, "TIENDA-002": {SKU: qty}}
             # Este JSON es solo para productos locales (LIA - Local Inventory Ads)
-            # Formato de salida: {SKU: {"store_code": qty}}
-            stock_dict = {}
+            # Formato de salida: {SKU: "store_code"} (primera tienda con el SKU)
+            first_store_by_sku = {}
             
             for store_code, products in stock_data.items():
-                for sku, qty in products.items():
-                    if sku not in stock_dict:
-                        stock_dict[sku] = {}
-                    stock_dict[sku][store_code] = qty
+                for sku in products:
+                    first_store_by_sku.setdefault(sku, store_code)
+            
+            _save_stock_cache(cache_key, first_store_by_sku)
             
-            total_skus = len(stock_dict)
+            total_skus = len(first_store_by_sku)
             total_stores = len(stock_data)
             logger.info(f"✓ Stock local cargado: {total_skus} SKUs en {total_stores} tiendas")
-            return (True, stock_dict, 200)
+            return (True, first_store_by_sku, 200)
         except Exception as e:
             logger.error(f"Error obteniendo stock local del JSON: {e}")
             return (False, None, 500)
     
-    return retry_with_backoff(get_stock, max_retries=5, debug_mode=False)
+    return retry_with_backoff(get_stock, max_retries=5)
 
 
 # ============================================================================
 # TRANSFORMACIÓN Y VALIDACIÓN
 # ============================================================================
 
-def price_to_micros(price_str: str) -> int:
+# Imagen usada cuando el producto no tiene una propia
+PLACEHOLDER_IMAGE = 'https://devlia.l3m.mx/wp-content/uploads/woocommerce-placeholder.webp'
+
+# Permalink generado a partir del SKU
+PERMALINK_FORMAT = 'https://devlia.l3m.mx/producto/{}/'
+
+# Plantillas de entry de custombatch: campos fijos por canal, creados una vez.
+# Cada producto copia la plantilla (copia superficial) y llena solo sus campos
+_ENTRY_TEMPLATE = {
+    'merchantId': MERCHANT_ID,
+    'method': 'insert',
+}
+_PRODUCT_TEMPLATES = {
+    channel: {
+        'channel': channel.upper(),  # ONLINE o LOCAL
+        'contentLanguage': 'es',
+        'targetCountry': 'MX',
+        'condition': 'new',
+    }
+    for channel in ('online', 'local')
+}
+
+
+def price_to_micros(price_str) -> int:
     """
-    Convierte precio string a micros (entero para Google API).
+    Convierte precio a micros (entero para Google API) con aritmética decimal.
     
     Args:
-        price_str: Precio como string (ej. "299.00")
+        price_str: Precio como Decimal o string (ej. "299.00")
     
     Returns:
         Precio en micros
     """
     try:
-        price_float = float(price_str)
-        return int(price_float * 1000000)
-    except (ValueError, TypeError):
+        return int(Decimal(price_str) * 1_000_000)
+    except (InvalidOperation, ValueError, TypeError):
         logger.warning(f"Precio inválido: {price_str}, usando 0")
         return 0
 
 
-def validate_product(wc_product: Dict) -> Tuple[bool, ValidationStatus]:
+def validate_product(wc_product: Product) -> Tuple[bool, ValidationStatus, Dict[str, str]]:
     """
     Valida un producto de WooCommerce con múltiples criterios.
     
+    Título no vacío y precio > 0 ya se filtran en las consultas SQL (con la
+    misma regla de espacios que .strip()); aquí se vuelven a verificar para
+    que el ValidationStatus refleje los datos reales. Los campos derivados
+    durante la validación se retornan listos para el entry, para que
+    wc_product_to_content_api_entry no los vuelva a calcular.
+    
     Args:
-        wc_product: Diccionario con datos del producto
+        wc_product: Product con datos del producto
     
     Returns:
-        Tupla (es_válido, ValidationStatus)
+        Tupla (es_válido, ValidationStatus, campos) con campos
+        {'availability', 'image_link', 'price_str'}
     """
-    validation = ValidationStatus()
-    
-    # Validar título
-    title = wc_product.get('name', '').strip()
-    if title:
-        validation.title_valid = True
-    else:
-        logger.warning(f"Producto sin título: SKU={wc_product.get('sku')}")
-        return (False, validation)
-    
-    # Validar precio
-    price = float(wc_product.get('price', 0))
-    if price > 0:
-        validation.price_valid = True
-    else:
-        logger.warning(f"Producto sin precio válido: SKU={wc_product.get('sku')}")
-        return (False, validation)
+    validation = ValidationStatus(
+        title_valid=bool(wc_product.name and wc_product.name.strip()),
+        price_valid=wc_product.price is not None and wc_product.price > 0
+    )
     
     # Validar imágenes (siempre válido porque usamos placeholder si falta)
-    images = wc_product.get('images', [])
-    if images:
-        validation.images_valid = True
-    else:
+    image_link = wc_product.image_url
+    validation.images_valid = True
+    if not image_link or not image_link.strip():
         # Usaremos placeholder, por lo que es válido
-        validation.images_valid = True
+        image_link = PLACEHOLDER_IMAGE
         if logger:
-            logger.debug(f"Producto sin imagen, usando placeholder: SKU={wc_product.get('sku')}")
+            logger.debug(f"Producto sin imagen, usando placeholder: SKU={wc_product.sku}")
     
     # Validar inventario
-    if wc_product.get('stock_status') == 'instock':
-        validation.inventory_valid = True
+    in_stock = wc_product.stock_status == 'instock'
+    validation.inventory_valid = in_stock
     
-    return (True, validation)
+    fields = {
+        'availability': 'in stock' if in_stock else 'out of stock',
+        'image_link': image_link,
+        # Content API v2.1 requiere precio en formato string (no micros);
+        # se formatea directo desde Decimal, sin pasar por float
+        'price_str': f"{wc_product.price:.2f}" if validation.price_valid else '',
+    }
+    return (validation.title_valid and validation.price_valid, validation, fields)
 
 
 def wc_product_to_content_api_entry(
-    wc_product: Dict,
+    wc_product: Product,
     channel: str = 'online',
     batch_id: int = 1,
     store_code: str = 'TIENDA-001'
@@ -728,7 +1167,7 @@ def wc_product_to_content_api_entry(
     Convierte producto WooCommerce a formato de entrada para Content API v2.1.
     
     Args:
-        wc_product: Diccionario del producto
+        wc_product: Product a convertir
         channel: Canal ('online' o 'local')
         batch_id: ID del batch (para correlación)
         store_code: Código de tienda (ej: TIENDA-001)
@@ -736,57 +1175,34 @@ def wc_product_to_content_api_entry(
     Returns:
         Dict con formato custombatch entry o None si inválido
     """
-    # Validar primero
-    is_valid, validation = validate_product(wc_product)
+    # Validar primero (también entrega disponibilidad, imagen y precio ya calculados)
+    is_valid, validation, fields = validate_product(wc_product)
     if not is_valid:
         return None
     
     try:
-        # Usar imagen de la BD o placeholder si está vacía
-        PLACEHOLDER_IMAGE = 'https://devlia.l3m.mx/wp-content/uploads/woocommerce-placeholder.webp'
-        image_link = wc_product.get('image_url') or PLACEHOLDER_IMAGE
-        if not image_link or image_link.strip() == '':
-            image_link = PLACEHOLDER_IMAGE
-        
-        availability = 'in stock' if wc_product.get('stock_status') == 'instock' else 'out of stock'
+        sku = wc_product.sku
         
-        # Content API v2.1 requiere precio en formato string (no micros)
-        price_value = float(wc_product['price'])
-        
-        # Generar permalink si no existe
-        permalink = wc_product.get('permalink', f"https://devlia.l3m.mx/producto/{wc_product.get('sku', 'sin-sku')}/")
+        # Estructura de entry para custombatch de Content API v2.1:
+        # campos fijos desde las plantillas, el resto por producto
+        entry = _ENTRY_TEMPLATE.copy()
+        entry['batchId'] = batch_id
+        product = entry['product'] = _PRODUCT_TEMPLATES[channel.lower()].copy()
         
         # Crear ID para Content API: channel:language:country:sku
         # Ejemplo: online:es:MX:SKU-001
-        product_id = f"{channel.lower()}:es:MX:{wc_product['sku']}"
-        
-        # Estructura de entry para custombatch de Content API v2.1
-        entry = {
-            'batchId': batch_id,
-            'merchantId': MERCHANT_ID,
-            'method': 'insert',
-            'product': {
-                'id': product_id,
-                'offerId': wc_product['sku'],
-                'title': wc_product['name'][:150],
-                'description': wc_product.get('description', '')[:5000],
-                'link': permalink,
-                'imageLink': image_link,
-                'price': {
-                    'value': f"{price_value:.2f}",
-                    'currency': 'MXN'
-                },
-                'availability': availability,
-                'channel': channel.upper(),  # ONLINE o LOCAL
-                'contentLanguage': 'es',
-                'targetCountry': 'MX',
-                'condition': 'new'
-            }
-        }
+        product['id'] = f"{channel.lower()}:es:MX:{sku}"
+        product['offerId'] = sku
+        product['title'] = wc_product.name[:150]
+        product['description'] = ''
+        product['link'] = PERMALINK_FORMAT.format(sku or 'sin-sku')
+        product['imageLink'] = fields['image_link']
+        product['price'] = {'value': fields['price_str'], 'currency': 'MXN'}
+        product['availability'] = fields['availability']
         
         return entry
     except Exception as e:
-        logger.error(f"Error transformando producto {wc_product.get('sku')} a Content API: {e}")
+        logger.error(f"Error transformando producto {wc_product.sku} a Content API: {e}")
         return None
 
 
@@ -794,47 +1210,39 @@ def wc_product_to_content_api_entry(
 # ENVÍO A GOOGLE API
 # ============================================================================
 
-def upload_product_batch(
-    service,
-    products: List[Dict],
+def build_batch_entries(
+    products: List[Product],
     channel: str = 'online',
-    stats: Optional[PipelineStats] = None,
-    debug_mode: bool = False,
-    batch_size: int = 100,
-    stock_dict: Optional[Dict] = None
-) -> int:
+    first_store_by_sku: Optional[Dict[str, str]] = None,
+    stats: Optional[PipelineStats] = None
+) -> Tuple[List[Dict], Dict[int, Product]]:
     """
-    Sube lotes de productos a Google Content API v2.1 usando custombatch.
-    MIGRACIÓN: De insert_product_input() → custombatch()
-    REFERENCIA: framework_docs/iniciales/SOLUCION-CONTENT-API.md
+    Convierte un lote de productos a entries de custombatch.
     
     Args:
-        service: Servicio de Google Content API v2.1
-        products: Lista de diccionarios de productos
+        products: Lista de Product (un custombatch)
         channel: Canal ('online' o 'local')
-        stats: Objeto de estadísticas
-        debug_mode: Si True, logs detallados
-        batch_size: Tamaño del batch (max 100 por API Google)
-        stock_dict: Dict con inventario local por tienda {SKU: {"TIENDA-001": qty}}
+        first_store_by_sku: Primera tienda con stock de cada SKU {SKU: "TIENDA-001"}
+        stats: Objeto de estadísticas (cuenta los inválidos)
     
     Returns:
-        Cantidad de productos enviados exitosamente
+        Tupla (entries, {batchId: (producto original, merchant_product_id)})
     """
-    sent_count = 0
     batch_entries = []
-    batch_products = []  # Mantener referencia a productos originales
+    batch_products = {}  # batchId → (producto original, merchant_product_id)
     batch_id = 1
     
-    for idx, product in enumerate(products):
-        # Para productos locales, determinar store_code del stock_dict
+    # merchant_product_id para tracking: prefijo fijo por canal + SKU
+    if channel == 'online':
+        merchant_id_prefix = 'online:'
+    else:
+        merchant_id_prefix = f"local:{STORE_CODE}:"
+    
+    for product in products:
+        # Para productos locales, tomar la primera tienda con stock del SKU
         store_code = STORE_CODE  # Default
-        if channel == 'local' and stock_dict:
-            sku = product.get('sku', '')
-            if sku in stock_dict:
-                # Tomar el primer store_code disponible para este SKU
-                available_stores = list(stock_dict[sku].keys())
-                if available_stores:
-                    store_code = available_stores[0]
+        if channel == 'local' and first_store_by_sku:
+            store_code = first_store_by_sku.get(product.sku, STORE_CODE)
         
         entry = wc_product_to_content_api_entry(
             product,
@@ -848,101 +1256,216 @@ def upload_product_batch(
             continue
         
         batch_entries.append(entry)
-        batch_products.append(product)  # Guardar producto original
+        batch_products[batch_id] = (product, merchant_id_prefix + product.sku)
         batch_id += 1
-        
-        # Enviar cuando alcancemos batch_size o sea el último producto
-        if len(batch_entries) >= batch_size or idx == len(products) - 1:
-            def send_batch():
-                try:
-                    request = service.products().custombatch(
-                        body={'entries': batch_entries}
-                    )
-                    response = request.execute()
-                    
-                    if response and 'entries' in response:
-                        errors = [e for e in response['entries'] if 'errors' in e]
-                        if debug_mode:
-                            logger.debug(f"Batch enviado: {len(batch_entries)} productos, {len(errors)} errores")
-                        return (True, response, 200 if not errors else 207)
-                    return (False, None, 400)
-                except Exception as e:
-                    logger.error(f"Error enviando batch a Content API: {e}")
-                    return (False, None, 500)
-            
-            success, response, status = retry_with_backoff(
-                send_batch,
-                max_retries=5,
-                debug_mode=debug_mode
+    
+    return (batch_entries, batch_products)
+
+
+def send_one_batch(
+    batch_entries: List[Dict],
+    batch_products: Dict[int, Tuple[Product, str]],
+    channel: str = 'online',
+    debug_mode: bool = False
+) -> List[Tuple]:
+    """
+    Envía un custombatch y arma las filas de tracking de su respuesta.
+    
+    Hace POST directo al endpoint products/batch con la sesión del hilo
+    (sin la capa de discovery de googleapiclient). Seguro para ejecutarse en
+    hilos del pool de envío: no toca estadísticas ni la BD.
+    
+    Args:
+        batch_entries: Entries de custombatch
+        batch_products: (producto original, merchant_product_id) por batchId
+        channel: Canal ('online' o 'local')
+        debug_mode: Si True, logs detallados
+    
+    Returns:
+        Filas (product_id, sku, channel, success, merchant_product_id,
+        error_message, last_modified) para update_sync_tracking_bulk
+    """
+    # Último código HTTP recibido (0 = sin respuesta), para el tracking si se
+    # agotan los reintentos (retry_with_backoff solo retorna None)
+    last_status = 0
+    
+    def send_batch():
+        nonlocal last_status
+        try:
+            http_response = _thread_session().post(
+                CONTENT_API_BATCH_URL,
+                data=orjson.dumps({'entries': batch_entries}),
+                headers={'Content-Type': 'application/json'},
+                timeout=30
             )
+            last_status = http_response.status_code
+            if http_response.status_code != 200:
+                logger.error(f"Content API respondió {http_response.status_code}: {http_response.text[:200]}")
+                return (False, None, http_response.status_code,
+                        parse_retry_after(http_response.headers.get('Retry-After')))
             
-            if success and response and 'entries' in response:
-                for i, entry_resp in enumerate(response['entries']):
-                    # Obtener el producto original correspondiente
-                    if i < len(batch_products):
-                        orig_product = batch_products[i]
-                        product_id = orig_product.get('id')
-                        sku = orig_product.get('sku', '')
-                        
-                        # Construir merchant_product_id
-                        if channel == 'online':
-                            merchant_product_id = f"online:{sku}"
-                        else:
-                            merchant_product_id = f"local:{STORE_CODE}:{sku}"
-                        
-                        if 'product' in entry_resp and 'errors' not in entry_resp:
-                            sent_count += 1
-                            
-                            # Actualizar tracking: sync exitoso
-                            update_sync_tracking(
-                                product_id=product_id,
-                                sku=sku,
-                                channel=channel,
-                                success=True,
-                                merchant_product_id=merchant_product_id
-                            )
-                            
-                            if stats:
-                                vs = ValidationStatus(
-                                    price_valid=True,
-                                    images_valid=True,
-                                    inventory_valid=True
-                                )
-                                stats.add_valid(vs)
-                                if channel == 'online':
-                                    stats.sent_online += 1
-                                else:
-                                    stats.sent_local += 1
-                        elif 'errors' in entry_resp:
-                            # Actualizar tracking: error en sync
-                            error_messages = [err.get('message', 'Unknown error') for err in entry_resp.get('errors', [])]
-                            error_text = '; '.join(error_messages)
-                            
-                            update_sync_tracking(
-                                product_id=product_id,
-                                sku=sku,
-                                channel=channel,
-                                success=False,
-                                merchant_product_id=merchant_product_id,
-                                error_message=error_text[:500]  # Limitar a 500 chars
-                            )
-                            
-                            if stats:
-                                stats.add_invalid()
+            response = orjson.loads(http_response.content)
+            if response and 'entries' in response:
+                errors = [e for e in response['entries'] if 'errors' in e]
+                if debug_mode:
+                    logger.debug(f"Batch enviado: {len(batch_entries)} productos, {len(errors)} errores")
+                return (True, response, 200 if not errors else 207)
+            return (False, None, 400)
+        except Exception as e:
+            logger.error(f"Error enviando batch a Content API: {e}")
+            return (False, None, 500)
+    
+    # retry_with_backoff retorna None si se agotan los reintentos
+    success, response, status = retry_with_backoff(
+        send_batch,
+        max_retries=5
+    ) or (False, None, 0)
+    
+    tracking_rows = []
+    if success and response and 'entries' in response:
+        for entry_resp in response['entries']:
+            # Correlacionar por batchId: Google no garantiza el orden de entries
+            match = batch_products.get(entry_resp.get('batchId'))
+            if match is None:
+                continue
+            
+            orig_product, merchant_product_id = match
+            product_id = orig_product.id
+            sku = orig_product.sku
             
-            # Reiniciar batch
-            batch_entries = []
-            batch_products = []
+            if 'product' in entry_resp and 'errors' not in entry_resp:
+                # Tracking: sync exitoso
+                tracking_rows.append(
+                    (product_id, sku, channel, True, merchant_product_id, None,
+                     orig_product.last_modified)
+                )
+            elif 'errors' in entry_resp:
+                # Tracking: error en sync
+                # 'errors' es un objeto {code, message, errors: [...]}, no una lista
+                errors = entry_resp.get('errors') or {}
+                error_messages = [err.get('message', 'Unknown error') for err in errors.get('errors', [])]
+                error_text = '; '.join(error_messages) or errors.get('message', 'Unknown error')
+                
+                tracking_rows.append(
+                    (product_id, sku, channel, False, merchant_product_id,
+                     error_text[:500],  # Limitar a 500 chars
+                     orig_product.last_modified)
+                )
+    elif not success:
+        # Sin respuesta tras los reintentos: todo el lote queda 'failed' para
+        # que la siguiente ejecución lo reintente aunque el checkpoint avance
+        error_text = f"Content API sin respuesta válida (HTTP {last_status})"
+        tracking_rows = [
+            (product.id, product.sku, channel, False, merchant_product_id,
+             error_text, product.last_modified)
+            for product, merchant_product_id in batch_products.values()
+        ]
+    
+    return tracking_rows
+
+
+# Estados para estadísticas de productos aceptados / rechazados por Google
+_SENT_STATUS = ValidationStatus(price_valid=True, images_valid=True, inventory_valid=True)
+_REJECTED_STATUS = ValidationStatus()
+
+
+def record_batch_result(
+    tracking_rows: List[Tuple],
+    channel: str = 'online',
+    stats: Optional[PipelineStats] = None
+) -> Optional[Tuple[datetime, int]]:
+    """
+    Registra el resultado de un custombatch: estadísticas y tracking.
+    Se ejecuta en el hilo principal.
+    
+    Args:
+        tracking_rows: Filas retornadas por send_one_batch
+        channel: Canal ('online' o 'local')
+        stats: Objeto de estadísticas
+    
+    Returns:
+        (post_modified, ID) más reciente entre los productos registrados como
+        sincronizados, o None si no hubo ninguno (o falló el tracking)
+    """
+    sent_count = sum(1 for row in tracking_rows if row[3])
+    if stats:
+        # Enviados cuentan como válidos y rechazados como inválidos,
+        # todo en una sola pasada sobre el lote
+        stats.consume_batch([_SENT_STATUS if row[3] else _REJECTED_STATUS for row in tracking_rows])
+        if channel == 'online':
+            stats.sent_online += sent_count
+        else:
+            stats.sent_local += sent_count
+    
+    # Actualizar tracking del lote completo en una sola transacción
+    if not update_sync_tracking_bulk(tracking_rows):
+        # Sin tracking estos productos no se reintentarían: no avanzar checkpoint
+        if stats:
+            stats.add_error()
+        return None
+    if not sent_count:
+        return None
+    return max((row[6], row[0]) for row in tracking_rows if row[3])
+
+
+def upload_product_batch(
+    products: List[Product],
+    channel: str = 'online',
+    stats: Optional[PipelineStats] = None,
+    debug_mode: bool = False,
+    batch_size: int = 100,
+    first_store_by_sku: Optional[Dict[str, str]] = None
+) -> int:
+    """
+    Sube lotes de productos a Google Content API v2.1 usando custombatch.
+    MIGRACIÓN: De insert_product_input() → custombatch()
+    REFERENCIA: framework_docs/iniciales/SOLUCION-CONTENT-API.md
+    
+    Versión secuencial; main() reparte los lotes entre hilos con
+    build_batch_entries / send_one_batch / record_batch_result.
+    
+    Args:
+        products: Lista de Product
+        channel: Canal ('online' o 'local')
+        stats: Objeto de estadísticas
+        debug_mode: Si True, logs detallados
+        batch_size: Tamaño del batch (max 100 por API Google)
+        first_store_by_sku: Primera tienda con stock de cada SKU {SKU: "TIENDA-001"}
+    
+    Returns:
+        Cantidad de productos enviados exitosamente
+    """
+    sent_count = 0
+    
+    for start in range(0, len(products), batch_size):
+        batch_entries, batch_products = build_batch_entries(
+            products[start:start + batch_size],
+            channel=channel,
+            first_store_by_sku=first_store_by_sku,
+            stats=stats
+        )
+        if not batch_entries:
+            continue
+        
+        tracking_rows = send_one_batch(
+            batch_entries, batch_products,
+            channel=channel, debug_mode=debug_mode
+        )
+        sent_count += sum(1 for row in tracking_rows if row[3])
+        record_batch_result(tracking_rows, channel=channel, stats=stats)
     
     return sent_count
 
 
-def delete_products_from_google(service, deleted_products: List[Dict], debug_mode: bool = False) -> int:
+def delete_products_from_google(deleted_products: List[Dict], debug_mode: bool = False) -> int:
     """
     Elimina productos del feed de Google Merchant Center.
     
+    Usa custombatch con entries method='delete' (hasta DELETE_BATCH_SIZE por
+    request) y un solo retry_with_backoff por lote, en lugar de un DELETE con
+    sus propios reintentos por producto.
+    
     Args:
-        service: Servicio de Google Content API v2.1
         deleted_products: Lista de dicts con {product_id, sku, channel, merchant_product_id}
         debug_mode: Si True, logs detallados
     
@@ -953,54 +1476,76 @@ def delete_products_from_google(service, deleted_products: List[Dict], debug_mod
         return 0
     
     deleted_count = 0
+    deleted_items = []  # (product_id, sku) para marcar en tracking al final
     
-    for product in deleted_products:
-        sku = product.get('sku')
-        channel = product.get('channel', 'online')
-        merchant_product_id = product.get('merchant_product_id')
-        product_id = product.get('product_id')
-        
-        # Si no tenemos merchant_product_id, construirlo
-        if not merchant_product_id:
-            if channel == 'online':
-                merchant_product_id = f"online:{sku}"
-            else:
-                merchant_product_id = f"local:{STORE_CODE}:{sku}"
+    for start in range(0, len(deleted_products), DELETE_BATCH_SIZE):
+        chunk = deleted_products[start:start + DELETE_BATCH_SIZE]
+        entries = [
+            {
+                'batchId': batch_id,
+                'merchantId': MERCHANT_ID,
+                'method': 'delete',
+                'productId': product['merchant_product_id'],  # Completado en SQL
+            }
+            for batch_id, product in enumerate(chunk)
+        ]
         
-        def delete_product():
+        def delete_batch():
             try:
-                service.products().delete(
-                    merchantId=MERCHANT_ID,
-                    productId=merchant_product_id
-                ).execute()
-                
-                if debug_mode:
-                    logger.debug(f"✓ Producto eliminado de Google: {merchant_product_id}")
+                http_response = _thread_session().post(
+                    CONTENT_API_BATCH_URL,
+                    data=orjson.dumps({'entries': entries}),
+                    headers={'Content-Type': 'application/json'},
+                    timeout=60
+                )
+                if http_response.status_code != 200:
+                    logger.error(f"Error eliminando lote de {len(entries)} productos: HTTP {http_response.status_code}")
+                    return (False, None, http_response.status_code,
+                            parse_retry_after(http_response.headers.get('Retry-After')))
                 
-                return (True, None, 200)
+                response = orjson.loads(http_response.content)
+                if response and 'entries' in response:
+                    return (True, response, 200)
+                return (False, None, 400)
             except Exception as e:
-                error_msg = str(e)
-                # Error 404 significa que el producto ya no existe en Google (OK)
-                if '404' in error_msg or 'not found' in error_msg.lower():
-                    if debug_mode:
-                        logger.debug(f"Producto {merchant_product_id} ya no existe en Google (404)")
-                    return (True, None, 404)
-                else:
-                    logger.error(f"Error eliminando producto {merchant_product_id}: {e}")
-                    return (False, None, 500)
+                logger.error(f"Error eliminando lote de {len(entries)} productos: {e}")
+                return (False, None, 500)
         
-        success, _, status = retry_with_backoff(
-            delete_product,
-            max_retries=3,
-            debug_mode=debug_mode
-        )
+        # retry_with_backoff retorna None si se agotan los reintentos
+        success, response, status = retry_with_backoff(
+            delete_batch,
+            max_retries=3
+        ) or (False, None, 0)
+        
+        if not success:
+            continue
         
-        if success:
+        for entry_resp in response['entries']:
+            batch_id = entry_resp.get('batchId')
+            if batch_id is None or not 0 <= batch_id < len(chunk):
+                continue
+            product = chunk[batch_id]
+            sku = product['sku']
+            merchant_product_id = product['merchant_product_id']
+            
+            errors = entry_resp.get('errors')
+            if errors and errors.get('code') != 404:
+                logger.error(f"Error eliminando producto {merchant_product_id}: {errors.get('message')}")
+                continue
+            
+            if errors and debug_mode:
+                # Error 404 significa que el producto ya no existe en Google (OK)
+                logger.debug(f"Producto {merchant_product_id} ya no existe en Google (404)")
+            elif debug_mode:
+                logger.debug(f"✓ Producto eliminado de Google: {merchant_product_id}")
+            
             deleted_count += 1
-            # Marcar como deleted en tracking
-            mark_product_as_deleted(product_id, sku)
+            deleted_items.append((product['product_id'], sku))
             logger.info(f"✓ Producto {sku} eliminado del feed de Google")
     
+    # Marcar como deleted en tracking (un solo UPDATE para todo el lote)
+    mark_products_as_deleted_bulk(deleted_items)
+    
     return deleted_count
 
 
@@ -1008,6 +1553,17 @@ def delete_products_from_google(service, deleted_products: List[Dict], debug_mod
 # ARGUMENTOS CLI
 # ============================================================================
 
+def _positive_int(value: str) -> int:
+    """Tipo argparse: entero mayor que cero."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' no es un entero válido")
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"debe ser mayor que 0 (recibido: {number})")
+    return number
+
+
 def parse_arguments() -> argparse.Namespace:
     """
     Analiza los argumentos de línea de comandos.
@@ -1025,7 +1581,7 @@ def parse_arguments() -> argparse.Namespace:
     )
     parser.add_argument(
         '--batch',
-        type=int,
+        type=_positive_int,
         default=100,
         help='Tamaño del lote para Google API (default: 100)'
     )
@@ -1056,6 +1612,8 @@ def main():
     
     # Inicializar logger
     logger = setup_logging(debug_mode=args.debug)
+    # Ctrl+C también despierta a los hilos de envío que esperan un reintento
+    install_shutdown_handler()
     
     logger.info("=" * 80)
     logger.info("INICIO: Pipeline WooCommerce → Google Content API v2.1")
@@ -1070,39 +1628,34 @@ def main():
             logger.error("Validación de entorno falló")
             return 1
         
-        # Paso 2: Determinar timestamp para sincronización incremental
-        last_sync = None if args.full else get_last_sync_timestamp()
+        # Crear pool de conexiones MySQL (reutilizado por todas las consultas)
+        init_db_pool()
+        check_recommended_indexes()
+        
+        # Paso 2: Determinar checkpoint para sincronización incremental
+        last_sync = None if args.full else get_sync_checkpoint()
         
         if args.full:
             logger.info("🔄 Modo: SINCRONIZACIÓN COMPLETA (--full)")
         elif last_sync:
-            logger.info(f"🔄 Modo: SINCRONIZACIÓN INCREMENTAL (desde {last_sync})")
+            logger.info(f"🔄 Modo: SINCRONIZACIÓN INCREMENTAL (desde {last_sync[0]}, ID {last_sync[1]})")
         else:
             logger.info("🔄 Modo: SINCRONIZACIÓN COMPLETA (primera ejecución)")
         
-        # Paso 3: Inicializar servicio Google Content API v2.1
+        # Paso 3: Inicializar credenciales de Google Content API v2.1
         logger.info("Inicializando Google Content API v2.1...")
-        result = init_google_clients()
-        
-        # retry_with_backoff retorna tupla (success, service, status_code)
-        if isinstance(result, tuple) and len(result) >= 3:
-            success, service, status_code = result[0], result[1], result[2]
-        else:
-            # Si no es tupla, intentamos asumirlo como service directo
-            success, service = True, result
+        # retry_with_backoff retorna None si se agotan los reintentos
+        success, credentials, status = init_google_clients() or (False, None, 0)
         
-        if not success or not service:
+        if not success or not credentials:
             logger.error("No se pudo inicializar Google Content API")
             return 1
         
-        # Paso 4: Obtener productos que necesitan sincronización (usando tracking)
-        logger.info("Obteniendo productos que necesitan sincronización...")
-        online_products, local_products = get_products_needing_sync(force_full=args.full)
-        
-        # Obtener stock local para LIA (Local Inventory Ads)
-        success, stock_dict, status = fetch_local_stock_from_json()
+        # Paso 4: Obtener stock local para LIA (Local Inventory Ads)
+        # retry_with_backoff retorna None si se agotan los reintentos
+        success, first_store_by_sku, status = fetch_local_stock_from_json() or (False, None, 0)
         
-        if not success or not stock_dict:
+        if not success or not first_store_by_sku:
             logger.error("No se pudo obtener stock local")
             return 1
         
@@ -1113,78 +1666,92 @@ def main():
             
             if deleted_products:
                 logger.warning(f"⚠️  Encontrados {len(deleted_products)} productos eliminados")
-                deleted_count = delete_products_from_google(service, deleted_products, debug_mode=args.debug)
+                deleted_count = delete_products_from_google(deleted_products, debug_mode=args.debug)
                 logger.info(f"✓ Eliminados {deleted_count} productos del feed de Google")
         else:
             logger.info("⏭️  Omitiendo detección de productos eliminados (--skip-cleanup)")
         
-        # Paso 6: Procesar y enviar
+        # Paso 6: Obtener (en streaming) productos que necesitan sincronización
+        # y enviarlos por lotes conforme llegan de la BD
         logger.info("Iniciando procesamiento y envío...")
         stats = PipelineStats()
         
-        # Procesar productos online usando Content API v2.1 custombatch
-        logger.info(f"Procesando {len(online_products)} productos Online...")
-        processor_online = BatchProcessor(batch_size=args.batch)
-        
-        for product in online_products:
-            batch = processor_online.add(product)
-            if batch:
-                upload_product_batch(
-                    service,
-                    batch,
-                    channel='online',
-                    stats=stats,
-                    debug_mode=args.debug,
-                    batch_size=args.batch,
-                    stock_dict=None  # Online no usa stock_dict
-                )
-        
-        final_batch = processor_online.flush()
-        if final_batch:
-            upload_product_batch(
-                service,
-                final_batch,
-                channel='online',
-                stats=stats,
-                debug_mode=args.debug,
-                batch_size=args.batch,
-                stock_dict=None  # Online no usa stock_dict
-            )
-        
-        # Procesar productos locales con inventario
-        logger.info(f"Procesando {len(local_products)} productos Locales...")
         # NOTA: Para productos locales, también usamos Content API v2.1
         # Los "locales" son productos que solo vemos en la tienda física (hidden en WooCommerce)
-        processor_local = BatchProcessor(batch_size=args.batch)
-        
-        for product in local_products:
-            batch = processor_local.add(product)
-            if batch:
-                upload_product_batch(
-                    service,
-                    batch,
-                    channel='local',
-                    stats=stats,
-                    debug_mode=args.debug,
-                    batch_size=args.batch,
-                    stock_dict=stock_dict  # Local usa stock_dict para LIA
+        channel_counts = {'online': 0, 'local': 0}
+        # (post_modified, ID) más reciente entre los productos registrados como synced
+        checkpoint = None
+        
+        # Los custombatch se envían en paralelo; estadísticas y tracking se
+        # registran en este hilo conforme terminan los envíos
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix='upload') as executor:
+            for channel in ('online', 'local'):
+                logger.info(f"Procesando productos {channel}...")
+                # Solo local usa el stock por tienda para LIA
+                channel_stock = first_store_by_sku if channel == 'local' else None
+                
+                # Un hilo lee de la BD mientras los hilos de envío suben lotes a
+                # Google; la cola acotada limita cuántos lotes quedan en memoria
+                batch_queue = ThreadSafeQueue(prefetch=UPLOAD_QUEUE_SIZE)
+                producer = threading.Thread(
+                    target=produce_product_batches,
+                    args=(args.full, channel, args.batch, batch_queue, last_sync, stats),
+                    name=f"db-{channel}",
+                    daemon=True
                 )
-        
-        final_batch = processor_local.flush()
-        if final_batch:
-            upload_product_batch(
-                service,
-                final_batch,
-                channel='local',
-                stats=stats,
-                debug_mode=args.debug,
-                batch_size=args.batch,
-                stock_dict=stock_dict  # Local usa stock_dict para LIA
-            )
-        
-        # Paso 7: Guardar timestamp de sincronización exitosa
-        current_timestamp = start_time.strftime('%Y-%m-%d %H:%M:%S')
-        save_last_sync_timestamp(current_timestamp)
+                producer.start()
+                
+                try:
+                    pending = set()
+                    while True:
+                        batch = batch_queue.get(timeout=None)
+                        if batch is None:
+                            break
+                        channel_counts[channel] += len(batch)
+                        
+                        entries, batch_products = build_batch_entries(
+                            batch, channel=channel, first_store_by_sku=channel_stock, stats=stats
+                        )
+                        if entries:
+                            pending.add(executor.submit(
+                                send_one_batch, entries, batch_products,
+                                channel, args.debug
+                            ))
+                        
+                        # Limitar lotes en vuelo: registrar los que ya terminaron
+                        if len(pending) >= UPLOAD_WORKERS:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                synced = record_batch_result(future.result(), channel=channel, stats=stats)
+                                if synced and (checkpoint is None or synced > checkpoint):
+                                    checkpoint = synced
+                    
+                    for future in wait(pending).done:
+                        synced = record_batch_result(future.result(), channel=channel, stats=stats)
+                        if synced and (checkpoint is None or synced > checkpoint):
+                            checkpoint = synced
+                finally:
+                    # Si el envío falla, el productor no debe quedar esperando lugar
+                    batch_queue.close()
+                
+                producer.join()
+        
+        logger.info(f"✓ Procesados Online: {channel_counts['online']} | Locales: {channel_counts['local']}")
+        
+        # Paso 7: Guardar checkpoint: el (post_modified, ID) más reciente
+        # registrado como synced, nunca uno anterior al guardado. Los productos
+        # fallidos quedan 'failed' en tracking y se reintentan aunque avance.
+        # Sin productos sincronizados se conserva el anterior: la hora del
+        # host no es comparable con post_modified (hora local de WordPress)
+        previous = get_sync_checkpoint()
+        if stats.total_errors:
+            logger.warning(f"{stats.total_errors} errores de lectura/tracking: se conserva el checkpoint anterior")
+        elif checkpoint is not None:
+            synced_checkpoint = (checkpoint[0].strftime('%Y-%m-%d %H:%M:%S'), checkpoint[1])
+            if previous is None or synced_checkpoint > previous:
+                save_last_sync_timestamp(synced_checkpoint[0], last_id=synced_checkpoint[1])
+        else:
+            logger.info("Ningún producto nuevo sincronizado: se conserva el checkpoint anterior")
         
         # Paso 8: Resumen final
         end_time = datetime.now()
@@ -1200,6 +1767,11 @@ def main():
         
         return 0
     
+    except KeyboardInterrupt:
+        # El checkpoint no se guarda: la próxima ejecución retoma desde el anterior
+        logger.warning("Pipeline interrumpido por el usuario")
+        return 130
+    
     except Exception as e:
         logger.error(f"Error crítico en el pipeline: {e}", exc_info=args.debug)
         return 1
@@ -4,14 +4,29 @@
 # Propósito: Utilidades Compartidas para Pipeline ETL
 # ============================================================================
 
+import sys
 import time
-import logging
+import queue
+import signal
 import threading
-from typing import Callable, Any, Optional, List, Dict
+import random
+import logging
+import itertools
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Any, ClassVar, Final, FrozenSet, Iterable, Iterator, Optional, List, Dict, Sequence, Tuple
 from dataclasses import dataclass, field
 import mysql.connector
+import mysql.connector.pooling
 from mysql.connector import Error
 
+# Logger del módulo (se obtiene una sola vez; getLogger toma un lock global)
+_LOG = logging.getLogger(__name__)
+
+# dataclass(slots=True) existe desde Python 3.10; en versiones anteriores
+# las clases quedan como dataclasses normales (con __dict__)
+_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
 
 # ============================================================================
 # CONFIGURACIÓN DE LOGGING
@@ -30,7 +45,7 @@ def setup_logging(debug_mode: bool = False, log_level: str = None) -> logging.Lo
     """
     level = log_level if log_level else ('DEBUG' if debug_mode else 'INFO')
     
-    logger = logging.getLogger(__name__)
+    logger = _LOG
     logger.setLevel(getattr(logging, level))
     
     # Handler de consola
@@ -47,100 +62,225 @@ def setup_logging(debug_mode: bool = False, log_level: str = None) -> logging.Lo
     return logger
 
 
+# ============================================================================
+# APAGADO ORDENADO
+# ============================================================================
+
+# Se activa al pedir apagado (Ctrl+C); corta las esperas de retry_with_backoff
+SHUTDOWN = threading.Event()
+
+
+def install_shutdown_handler():
+    """
+    Instala un handler de SIGINT que activa SHUTDOWN.
+    
+    Los hilos dormidos en un backoff (p. ej. 60s de rate limit) despiertan
+    y abandonan sus reintentos; el hilo principal recibe KeyboardInterrupt
+    igual que antes. Debe llamarse desde el hilo principal, al inicio de
+    cada ejecución: limpia SHUTDOWN por si una ejecución anterior en el
+    mismo proceso lo dejó activado.
+    """
+    SHUTDOWN.clear()
+    
+    def handler(signum, frame):
+        SHUTDOWN.set()
+        signal.default_int_handler(signum, frame)
+    
+    signal.signal(signal.SIGINT, handler)
+
+
 # ============================================================================
 # REINTENTOS CON BACKOFF EXPONENCIAL
 # ============================================================================
 
+# Excepciones de transporte que vale la pena reintentar. OSError cubre
+# ConnectionError, TimeoutError y requests.RequestException; Error es el de
+# mysql.connector. Cualquier otra (TypeError, KeyError...) es un bug y se propaga.
+RETRYABLE = (OSError, Error)
+
+# Acciones de reintento por código de estado
+_BACKOFF = 'backoff'        # Backoff exponencial (tope max_wait)
+_RATE_LIMIT = 'rate_limit'  # Retry-After o hasta rate_limit_wait
+_ABORT = 'abort'            # No reintentar
+
+# Código → (acción, mensaje). Los mensajes de reintento reciben
+# (código, intento, máximo); los de _ABORT solo el código.
+_RETRY_POLICY: Dict[int, Tuple[str, str]] = {
+    500: (_BACKOFF, "Error del servidor (%s). Intento %d de %d"),
+    502: (_BACKOFF, "Error del servidor (%s). Intento %d de %d"),
+    503: (_BACKOFF, "Error del servidor (%s). Intento %d de %d"),
+    504: (_BACKOFF, "Error del servidor (%s). Intento %d de %d"),
+    429: (_RATE_LIMIT, "Rate limit excedido (%s). Intento %d de %d"),
+    401: (_BACKOFF, "Token inválido o expirado (%s). Intento %d de %d"),
+    403: (_ABORT, "Error del cliente (%s). Omitiendo sin reintentar."),
+    404: (_ABORT, "Error del cliente (%s). Omitiendo sin reintentar."),
+}
+_DEFAULT_RETRY_POLICY: Tuple[str, str] = (_BACKOFF, "Error HTTP %s. Intento %d de %d")
+
+
 def retry_with_backoff(
     func: Callable,
     max_retries: int = 7,
     base_wait: int = 2,
     rate_limit_wait: int = 60,
-    debug_mode: bool = False
+    max_wait: int = 60,
+    jitter: bool = True,
+    shutdown_event: Optional[threading.Event] = None
 ) -> Optional[Any]:
     """
     Ejecuta una función con reintentos y backoff exponencial.
     
-    Maneja diferenciadamente:
+    Maneja diferenciadamente (según _RETRY_POLICY):
     - Errores 401: Señal de que el token ha expirado
-    - Errores 429: Rate limit (espera fija de 60 segundos)
-    - Otros errores: Backoff exponencial (2^attempt)
+    - Errores 429: Rate limit (hasta rate_limit_wait segundos)
+    - Errores 403/404: Se omiten sin reintentar
+    - Otros errores: Backoff exponencial (2^attempt, tope max_wait)
+    
+    Con jitter=True cada espera es aleatoria en [0, tope] ("full jitter"):
+    varios hilos que fallan a la vez no reintentan sincronizados.
+    
+    Los fallos HTTP deben reportarse retornando (False, None, código); func
+    solo debería lanzar excepciones de transporte (RETRYABLE), que se
+    reintentan. Cualquier otra excepción se propaga sin reintentar.
+    
+    func puede retornar opcionalmente un cuarto elemento con los segundos
+    indicados por el servidor (Retry-After, ver parse_retry_after); en un
+    429 se espera exactamente ese tiempo.
     
     Args:
         func: Función callable que retorna (success: bool, result: Any, error_code: int)
+              o (success, result, error_code, retry_after_seconds)
         max_retries: Número máximo de intentos (default: 7)
         base_wait: Base para backoff exponencial (default: 2)
-        rate_limit_wait: Espera para error 429 (default: 60)
-        debug_mode: Si True, imprime logs detallados
+        rate_limit_wait: Espera máxima para error 429 (default: 60)
+        max_wait: Tope de la espera exponencial en segundos (default: 60)
+        jitter: Si True, espera aleatoria entre 0 y el tope (default: True)
+        shutdown_event: Evento que interrumpe las esperas entre intentos
+                        (default: SHUTDOWN del módulo)
     
     Returns:
         Resultado de la función si éxito, None si fallan todos los intentos
     
+    Raises:
+        Exception: Las excepciones de func que no están en RETRYABLE
+    
     Ejemplo:
         def my_api_call():
             try:
                 response = requests.get('...')
                 return (response.ok, response.json(), response.status_code)
-            except Exception as e:
+            except requests.RequestException:
                 return (False, None, 0)
         
-        result = retry_with_backoff(my_api_call, max_retries=7, debug_mode=True)
+        result = retry_with_backoff(my_api_call, max_retries=7)
+    
+    Los mensajes de detalle van a logger.debug; se ven al configurar el
+    logger en nivel DEBUG (setup_logging(debug_mode=True)).
     """
-    logger = logging.getLogger(__name__)
+    logger = _LOG
+    if shutdown_event is None:
+        shutdown_event = SHUTDOWN
+    
+    def backoff_wait(attempt: int, cap: int) -> float:
+        # min(attempt, 10) evita exponentes enormes con max_retries altos
+        ceiling = min(cap, base_wait ** min(attempt, 10))
+        return random.uniform(0, ceiling) if jitter else ceiling
     
     for attempt in range(max_retries):
         try:
-            success, result, status_code = func()
+            res = func()
+            success, result, status_code = res[0], res[1], res[2]
+            retry_after = res[3] if len(res) > 3 else None
             
             if success:
-                if debug_mode:
-                    logger.debug(f"✓ Intento {attempt + 1}: Éxito")
+                logger.debug("✓ Intento %d: Éxito", attempt + 1)
                 return (success, result, status_code)
             
-            # Si no fue exitoso, decidir si reintentar
-            if status_code in [500, 502, 503, 504]:
-                logger.warning(f"Error del servidor ({status_code}). Intento {attempt + 1} de {max_retries}")
-                wait_time = base_wait ** attempt
-            elif status_code == 429:
-                logger.warning(f"Rate limit excedido (429). Intento {attempt + 1} de {max_retries}")
-                wait_time = rate_limit_wait
-            elif status_code == 401:
-                logger.warning(f"Token inválido o expirado (401). Intento {attempt + 1} de {max_retries}")
-                wait_time = base_wait ** attempt
-            elif status_code in [404, 403]:
-                logger.error(f"Error del cliente ({status_code}). Omitiendo sin reintentar.")
+            # Si no fue exitoso, decidir si reintentar (tabla _RETRY_POLICY)
+            action, message = _RETRY_POLICY.get(status_code, _DEFAULT_RETRY_POLICY)
+            if action == _ABORT:
+                logger.error(message, status_code)
                 return None
+            
+            logger.warning(message, status_code, attempt + 1, max_retries)
+            if action == _RATE_LIMIT:
+                if retry_after is not None:
+                    wait_time = retry_after  # Lo que indicó el servidor
+                elif jitter:
+                    wait_time = backoff_wait(attempt, rate_limit_wait)
+                else:
+                    wait_time = rate_limit_wait
             else:
-                logger.warning(f"Error HTTP {status_code}. Intento {attempt + 1} de {max_retries}")
-                wait_time = base_wait ** attempt
+                wait_time = backoff_wait(attempt, max_wait)
             
             if attempt < max_retries - 1:
-                if debug_mode:
-                    logger.debug(f"Reintentando en {wait_time} segundos...")
-                time.sleep(wait_time)
+                logger.debug("Reintentando en %.1f segundos...", wait_time)
+                # Event.wait usa reloj monotónico y retorna True si se pidió apagar
+                if shutdown_event.wait(wait_time):
+                    logger.warning("Apagado solicitado. Cancelando reintentos.")
+                    return None
             else:
-                logger.error(f"Máximo de reintentos ({max_retries}) alcanzado. Omitiendo.")
+                logger.error("Máximo de reintentos (%d) alcanzado. Omitiendo.", max_retries)
                 return None
         
-        except Exception as e:
-            logger.error(f"Excepción en intento {attempt + 1}: {e}")
+        except RETRYABLE as e:
+            logger.error("Excepción en intento %d: %s", attempt + 1, e)
             if attempt < max_retries - 1:
-                wait_time = base_wait ** attempt
-                if debug_mode:
-                    logger.debug(f"Reintentando en {wait_time} segundos...")
-                time.sleep(wait_time)
+                wait_time = backoff_wait(attempt, max_wait)
+                logger.debug("Reintentando en %.1f segundos...", wait_time)
+                # Event.wait usa reloj monotónico y retorna True si se pidió apagar
+                if shutdown_event.wait(wait_time):
+                    logger.warning("Apagado solicitado. Cancelando reintentos.")
+                    return None
             else:
-                logger.error(f"Máximo de reintentos ({max_retries}) alcanzado. Omitiendo.")
+                logger.error("Máximo de reintentos (%d) alcanzado. Omitiendo.", max_retries)
                 return None
     
     return None
 
 
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Convierte un header Retry-After a segundos de espera.
+    
+    Acepta ambos formatos del RFC 7231: segundos ("120") o fecha HTTP
+    ("Wed, 21 Oct 2015 07:28:00 GMT").
+    
+    Args:
+        value: Valor del header (o None si no vino)
+    
+    Returns:
+        Segundos a esperar (>= 0) o None si no hay valor válido
+    """
+    if not value:
+        return None
+    
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
 # ============================================================================
 # VALIDACIÓN MULTI-ETAPA
 # ============================================================================
 
-@dataclass
+_BUILTIN_FIELDS: Final[FrozenSet[str]] = frozenset({
+    'price_valid', 'images_valid', 'inventory_valid', 'title_valid', 'description_valid'
+})
+_DEFAULT_REQUIRED_FIELDS: Final[Tuple[str, ...]] = ('price_valid', 'images_valid', 'inventory_valid')
+
+
+@dataclass(**_SLOTS)
 class ValidationStatus:
     """
     Estado de validación de un producto con múltiples criterios.
@@ -159,6 +299,15 @@ class ValidationStatus:
     description_valid: bool = False
     custom_validations: Dict[str, bool] = field(default_factory=dict)
     
+    # (atributo, etiqueta) en el orden en que aparecen en summary()
+    _LABELS: ClassVar[Tuple[Tuple[str, str], ...]] = (
+        ('price_valid', 'precio_ok'),
+        ('images_valid', 'imágenes_ok'),
+        ('inventory_valid', 'inventario_ok'),
+        ('title_valid', 'título_ok'),
+        ('description_valid', 'descripción_ok'),
+    )
+    
     def is_valid(self, required_fields: Optional[List[str]] = None) -> bool:
         """
         Verifica si el producto cumple con todas las validaciones requeridas.
@@ -171,35 +320,19 @@ class ValidationStatus:
         """
         if required_fields is None:
             # Validación por defecto: precio, imágenes, inventario
-            required_fields = ['price_valid', 'images_valid', 'inventory_valid']
+            required_fields = _DEFAULT_REQUIRED_FIELDS
         
-        for field in required_fields:
-            if field in ['price_valid', 'images_valid', 'inventory_valid', 'title_valid', 'description_valid']:
-                if not getattr(self, field, False):
-                    return False
-            elif field in self.custom_validations:
-                if not self.custom_validations[field]:
-                    return False
-        
-        return True
+        # Campos que no son built-in ni custom no bloquean la validación
+        return all(
+            getattr(self, name) if name in _BUILTIN_FIELDS
+            else self.custom_validations.get(name, True)
+            for name in required_fields
+        )
     
     def summary(self) -> str:
         """Retorna un resumen en string de las validaciones."""
-        parts = []
-        if self.price_valid:
-            parts.append("precio_ok")
-        if self.images_valid:
-            parts.append("imágenes_ok")
-        if self.inventory_valid:
-            parts.append("inventario_ok")
-        if self.title_valid:
-            parts.append("título_ok")
-        if self.description_valid:
-            parts.append("descripción_ok")
-        
-        for key, value in self.custom_validations.items():
-            if value:
-                parts.append(f"{key}_ok")
+        parts = [label for attr, label in self._LABELS if getattr(self, attr)]
+        parts += [f"{key}_ok" for key, value in self.custom_validations.items() if value]
         
         return f"[{', '.join(parts)}]" if parts else "[SIN VALIDACIONES]"
 
@@ -223,19 +356,33 @@ class BatchProcessor:
         final_batch = processor.flush()
         if final_batch:
             send_to_api(final_batch)
+    
+    Si los datos vienen de un iterable, chunks() hace lo mismo sin estado:
+        for batch in BatchProcessor.chunks(large_dataset, 500):
+            send_to_api(batch)
     """
     
+    # Atributos a offsets fijos (sin __dict__): add() está en el camino por item
+    __slots__ = ('batch_size', 'batch', '_i', 'total_processed', 'logger')
+    
     def __init__(self, batch_size: int = 500):
         """
         Inicializa el procesador de lotes.
         
         Args:
             batch_size: Tamaño máximo del lote (default: 500)
+        
+        Raises:
+            ValueError: Si batch_size no es mayor que 0
         """
+        if batch_size <= 0:
+            raise ValueError(f"batch_size debe ser mayor que 0 (recibido: {batch_size})")
         self.batch_size = batch_size
-        self.batch: List[Any] = []
+        # Buffer preasignado + puntero de escritura: no crece ni se realoca
+        self.batch: List[Any] = [None] * batch_size
+        self._i = 0
         self.total_processed = 0
-        self.logger = logging.getLogger(__name__)
+        self.logger = _LOG
     
     def add(self, item: Any) -> Optional[List[Any]]:
         """
@@ -247,9 +394,12 @@ class BatchProcessor:
         Returns:
             Lista de items si se alcanzó batch_size, None en caso contrario
         """
-        self.batch.append(item)
+        i = self._i
+        self.batch[i] = item
+        i += 1
+        self._i = i
         
-        if len(self.batch) >= self.batch_size:
+        if i == self.batch_size:
             return self.flush()
         
         return None
@@ -261,23 +411,55 @@ class BatchProcessor:
         Returns:
             Lista de items o None si el lote está vacío
         """
-        if not self.batch:
+        if not self._i:
             return None
         
-        result = self.batch.copy()
-        self.total_processed += len(self.batch)
-        self.batch.clear()
+        # Se entrega una copia de la parte llena; el buffer se reutiliza sin
+        # realocar, pero sus slots se vacían para no retener los items entregados
+        i = self._i
+        result = self.batch[:i]
+        self.batch[:i] = [None] * i
+        self._i = 0
+        self.total_processed += len(result)
         
-        self.logger.debug(f"Lote procesado: {len(result)} items. Total: {self.total_processed}")
+        self.logger.debug("Lote procesado: %d items. Total: %d", len(result), self.total_processed)
         return result
     
+    @staticmethod
+    def chunks(iterable: Iterable[Any], batch_size: int = 500) -> Iterator[List[Any]]:
+        """
+        Divide un iterable en lotes de hasta batch_size items, en streaming.
+        
+        Cada lote se arma directo con itertools.islice (sin pasar por el
+        buffer de add/flush); el último puede ser más chico.
+        
+        Args:
+            iterable: Items a agrupar (se consume una sola vez)
+            batch_size: Tamaño máximo del lote (default: 500)
+        
+        Yields:
+            Lista de items por lote
+        
+        Raises:
+            ValueError: Si batch_size no es mayor que 0
+        """
+        if batch_size <= 0:
+            raise ValueError(f"batch_size debe ser mayor que 0 (recibido: {batch_size})")
+        it = iter(iterable)
+        while True:
+            chunk = list(itertools.islice(it, batch_size))
+            if not chunk:
+                return
+            yield chunk
+    
     def size(self) -> int:
         """Retorna el tamaño actual del lote."""
-        return len(self.batch)
+        return self._i
     
     def clear(self):
         """Limpia el lote sin procesarlo."""
-        self.batch.clear()
+        self.batch[:self._i] = [None] * self._i
+        self._i = 0
 
 
 # ============================================================================
@@ -286,16 +468,28 @@ class BatchProcessor:
 
 class ThreadSafeQueue:
     """
-    Cola thread-safe con sincronización usando threading.Condition.
+    Cola thread-safe acotada: envoltura delgada sobre queue.Queue.
+    
+    Con prefetch > 1 el productor puede preparar los siguientes items mientras
+    el consumidor procesa el actual (antes la cola era de un solo lugar y
+    ambos hilos avanzaban por turnos). El fin se señala encolando None.
+    
+    Los logs se emiten después de que queue.Queue libera su lock interno:
+    el logging (con su propio lock y E/S) nunca serializa put/get.
+    
+    Si el consumidor deja de leer (error o Ctrl+C) debe llamar close(): las
+    esperas de put/mark_finished revisan close() y SHUTDOWN periódicamente,
+    así el productor nunca queda bloqueado con la cola llena.
     
     Modelada después de process_and_send_product_batches del script validado.
     
     Ejemplo:
-        queue = ThreadSafeQueue()
+        queue = ThreadSafeQueue(prefetch=4)
         
         def producer():
             for item in items:
                 queue.put(item)
+            queue.mark_finished()
         
         def consumer():
             while True:
@@ -308,134 +502,230 @@ class ThreadSafeQueue:
         threading.Thread(target=consumer).start()
     """
     
-    def __init__(self):
-        """Inicializa la cola thread-safe."""
-        self.lock = threading.Lock()
-        self.condition = threading.Condition(lock=self.lock)
-        self.queue: Optional[Any] = None
-        self.finished = threading.Event()
-        self.logger = logging.getLogger(__name__)
+    def __init__(self, prefetch: int = 4):
+        """
+        Inicializa la cola thread-safe.
+        
+        Args:
+            prefetch: Máximo de items en espera antes de bloquear al productor
+        """
+        self._q: queue.Queue = queue.Queue(maxsize=prefetch)
+        self._closed = threading.Event()
+        self.logger = _LOG
+    
+    # Intervalo (segundos) para revisar close()/SHUTDOWN mientras se espera lugar
+    _POLL_INTERVAL: ClassVar[float] = 0.5
+    
+    def _put_waiting(self, item: Any, timeout: Optional[float]) -> Optional[bool]:
+        """
+        Encola esperando lugar en tramos cortos.
+        
+        Returns:
+            True si se encoló, False si la cola se cerró o hay SHUTDOWN,
+            None si se agotó el timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not (self._closed.is_set() or SHUTDOWN.is_set()):
+            wait = self._POLL_INTERVAL
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return None
+            try:
+                self._q.put(item, timeout=wait)
+                return True
+            except queue.Full:
+                continue
+        return False
     
-    def put(self, item: Any, timeout: int = 30):
+    def put(self, item: Any, timeout: Optional[float] = 30) -> bool:
         """
-        Agrega un item a la cola. Espera si hay un item pendiente.
+        Agrega un item a la cola. Espera si la cola está llena.
         
         Args:
             item: Item a agregar
-            timeout: Tiempo máximo de espera (segundos)
+            timeout: Tiempo máximo de espera (segundos); None espera indefinidamente
         
         Returns:
-            True si éxito, False si timeout
+            True si éxito, False si timeout, cola cerrada o SHUTDOWN
         """
-        with self.condition:
-            # Esperar a que el item anterior sea procesado
-            start_time = time.time()
-            while self.queue is not None:
-                elapsed = time.time() - start_time
-                if elapsed > timeout:
-                    self.logger.warning(f"Timeout esperando a que se procese item anterior ({timeout}s)")
-                    return False
-                remaining = timeout - elapsed
-                self.condition.wait(timeout=remaining)
-            
-            self.queue = item
-            self.condition.notify()
-            self.logger.debug(f"Item agregado a cola")
-            return True
+        result = self._put_waiting(item, timeout)
+        if result is None:
+            self.logger.warning("Timeout esperando lugar en la cola (%ss)", timeout)
+            return False
+        if not result:
+            self.logger.debug("Cola cerrada: item descartado")
+            return False
+        self.logger.debug("Item agregado a cola")
+        return True
     
-    def get(self, timeout: int = 30) -> Optional[Any]:
+    def get(self, timeout: Optional[float] = 30) -> Optional[Any]:
         """
         Obtiene un item de la cola. Espera si no hay items.
         
         Args:
-            timeout: Tiempo máximo de espera (segundos)
+            timeout: Tiempo máximo de espera (segundos); None espera indefinidamente
         
         Returns:
             Item o None si timeout o finished
         """
-        with self.condition:
-            start_time = time.time()
-            while self.queue is None:
-                if self.finished.is_set():
-                    self.logger.debug("Finished flag establecido, terminando consumer")
-                    return None
-                elapsed = time.time() - start_time
-                if elapsed > timeout:
-                    self.logger.debug(f"Timeout esperando item ({timeout}s)")
-                    return None
-                remaining = timeout - elapsed
-                self.condition.wait(timeout=remaining)
-            
-            item = self.queue
-            self.queue = None
-            self.condition.notify()
-            self.logger.debug(f"Item obtenido de cola")
-            return item
+        try:
+            item = self._q.get(timeout=timeout)
+        except queue.Empty:
+            self.logger.debug("Timeout esperando item (%ss)", timeout)
+            return None
+        
+        if item is None:
+            # Reencolar la señal de fin para que otros consumidores también terminen
+            try:
+                self._q.put_nowait(None)
+            except queue.Full:
+                pass
+            self.logger.debug("Señal de fin recibida, terminando consumer")
+            return None
+        
+        self.logger.debug("Item obtenido de cola")
+        return item
     
     def mark_finished(self):
-        """Marca la cola como finalizada (no hay más items)."""
-        with self.condition:
-            self.finished.set()
-            self.condition.notify_all()
+        """
+        Marca la cola como finalizada (no hay más items).
+        
+        Espera lugar para la señal de fin salvo que el consumidor ya haya
+        cerrado la cola o haya SHUTDOWN: en ese caso nadie la leería.
+        """
+        if self._put_waiting(None, timeout=None):
             self.logger.debug("Cola marcada como finalizada")
+    
+    def close(self):
+        """
+        Cierra la cola desde el consumidor: los put/mark_finished en espera
+        (y los siguientes) terminan sin encolar.
+        """
+        self._closed.set()
 
 
 # ============================================================================
 # CONEXIÓN A MYSQL
 # ============================================================================
 
+_POOL: Optional[mysql.connector.pooling.MySQLConnectionPool] = None
+
+
+def _init_pool(pool_size: int = 8, **kwargs) -> mysql.connector.pooling.MySQLConnectionPool:
+    """
+    Crea (una sola vez) el pool de conexiones MySQL del módulo.
+    
+    Args:
+        pool_size: Máximo de conexiones abiertas en el pool
+        **kwargs: Parámetros de conexión (host, user, password, database...)
+    
+    Returns:
+        Pool de conexiones
+    """
+    global _POOL
+    if _POOL is None:
+        _POOL = mysql.connector.pooling.MySQLConnectionPool(
+            pool_name='lia',
+            pool_size=pool_size,
+            charset='utf8mb4',
+            collation='utf8mb4_unicode_ci',
+            autocommit=False,
+            **kwargs
+        )
+    return _POOL
+
+
 def get_mysql_connection(
     host: str = 'localhost',
     user: str = None,
     password: str = None,
     database: str = None,
     max_retries: int = 5,
-    debug_mode: bool = False
-) -> Optional[mysql.connector.MySQLConnection]:
+    pool_size: int = 8
+) -> Optional[mysql.connector.pooling.PooledMySQLConnection]:
     """
-    Obtiene conexión a MySQL con reintentos.
+    Obtiene una conexión MySQL del pool del módulo.
+    
+    El pool (y el handshake con el servidor) se crea en la primera llamada,
+    con reintentos; las siguientes solo toman una conexión ya abierta.
+    conn.close() la regresa al pool. Los parámetros de conexión solo se
+    usan al crear el pool.
     
     Args:
         host: Host de MySQL
         user: Usuario de MySQL
         password: Contraseña de MySQL
         database: Base de datos
-        max_retries: Número máximo de intentos
-        debug_mode: Si True, imprime logs detallados
+        max_retries: Número máximo de intentos al crear el pool
+        pool_size: Tamaño del pool (solo en la primera llamada)
     
     Returns:
         Conexión MySQL o None si falla
     """
-    logger = logging.getLogger(__name__)
+    logger = _LOG
     
     def connect():
         try:
-            connection = mysql.connector.connect(
+            pool = _init_pool(
+                pool_size=pool_size,
                 host=host,
                 user=user,
                 password=password,
-                database=database,
-                charset='utf8mb4',
-                collation='utf8mb4_unicode_ci',
-                autocommit=False
+                database=database
             )
-            if connection.is_connected():
-                db_info = connection.get_server_info()
-                logger.info(f"✓ Conectado a MySQL Server versión {db_info}")
-                return (True, connection, 200)
-            return (False, None, 0)
+            logger.info("✓ Pool MySQL '%s' listo (%d conexiones)", pool.pool_name, pool_size)
+            return (True, pool, 200)
         except Error as e:
-            logger.error(f"Error de conexión a MySQL: {e}")
+            logger.error("Error de conexión a MySQL: %s", e)
             return (False, None, 500)
     
-    return retry_with_backoff(connect, max_retries=max_retries, debug_mode=debug_mode)
+    if _POOL is None:
+        # retry_with_backoff retorna None si se agotan los reintentos
+        success, _, _ = retry_with_backoff(connect, max_retries=max_retries) or (False, None, 0)
+        if not success:
+            return None
+    
+    try:
+        return _POOL.get_connection()
+    except Error as e:
+        logger.error("Error obteniendo conexión del pool: %s", e)
+        return None
+
+
+# ============================================================================
+# ÍNDICES RECOMENDADOS
+# ============================================================================
+
+# Índices recomendados para las consultas del pipeline: (tabla, nombre, columnas).
+# init_database.py los crea; el pipeline verifica su presencia al iniciar
+RECOMMENDED_INDEXES = [
+    # Búsquedas de metadatos por (post_id, meta_key) resueltas desde el índice
+    ('wp_postmeta', 'idx_postmeta_post_key_val', 'post_id, meta_key(191), meta_value(64)'),
+    # Pivote de metadatos: rango por meta_key y agrupación por post_id desde el índice
+    ('wp_postmeta', 'idx_postmeta_key_post_val', 'meta_key(191), post_id, meta_value(191)'),
+    # Detección de eliminados: filtra por sync_status y sondea wp_posts por product_id
+    ('wp_product_sync_tracking', 'idx_sync_status_pid', 'sync_status, product_id'),
+]
+
+# Índices que solo se verifican (con warning si faltan): están sobre tablas de
+# WordPress, así que init_database.py nunca los crea
+CHECK_ONLY_INDEXES = [
+    # Productos publicados: filtro por tipo/estado y keyset incremental (post_modified, ID)
+    ('wp_posts', 'idx_posts_type_status_modified', 'post_type, post_status, post_modified, ID'),
+]
 
 
 # ============================================================================
 # ESTADÍSTICAS DE PIPELINE
 # ============================================================================
 
-@dataclass
+# Separadores del reporte (se construyen una sola vez)
+_SEP60 = '=' * 60
+_DASH60 = '-' * 60
+
+
+@dataclass(**_SLOTS)
 class PipelineStats:
     """
     Estadísticas del pipeline ETL.
@@ -455,7 +745,7 @@ class PipelineStats:
     
     # Errores
     total_errors: int = 0
-    logger: logging.Logger = field(default_factory=lambda: logging.getLogger(__name__))
+    logger: ClassVar[logging.Logger] = _LOG
     
     def add_valid(self, validation_status: ValidationStatus):
         """Registra un producto válido."""
@@ -469,6 +759,42 @@ class PipelineStats:
         if validation_status.inventory_valid:
             self.with_valid_inventory += 1
     
+    def consume_batch(self, statuses: Sequence[ValidationStatus]) -> List[bool]:
+        """
+        Valida un lote y actualiza las estadísticas en una sola pasada.
+        
+        Equivale a llamar is_valid() y luego add_valid() / add_invalid() por
+        producto, pero recorre los ValidationStatus una sola vez.
+        
+        Args:
+            statuses: ValidationStatus de cada producto del lote
+        
+        Returns:
+            Máscara (un bool por producto) de los que pasan is_valid()
+        """
+        mask = []
+        prices = images = inventory = valid = 0
+        for status in statuses:
+            price_ok = status.price_valid
+            images_ok = status.images_valid
+            inventory_ok = status.inventory_valid
+            ok = price_ok and images_ok and inventory_ok
+            mask.append(ok)
+            if ok:
+                valid += 1
+                prices += price_ok
+                images += images_ok
+                inventory += inventory_ok
+        
+        n = len(mask)
+        self.total_processed += n
+        self.total_valid += valid
+        self.total_invalid += n - valid
+        self.with_valid_prices += prices
+        self.with_valid_images += images
+        self.with_valid_inventory += inventory
+        return mask
+    
     def add_invalid(self):
         """Registra un producto inválido."""
         self.total_invalid += 1
@@ -480,26 +806,23 @@ class PipelineStats:
     
     def report(self) -> str:
         """Retorna un reporte de estadísticas."""
-        lines = [
-            "",
-            "=" * 60,
-            "ESTADÍSTICAS DEL PIPELINE".center(60),
-            "=" * 60,
-            f"  Total procesados:        {self.total_processed:>6}",
-            f"  Válidos:                 {self.total_valid:>6}",
-            f"  Inválidos:               {self.total_invalid:>6}",
-            f"  Errores:                 {self.total_errors:>6}",
-            "-" * 60,
-            f"  Con precios válidos:     {self.with_valid_prices:>6}",
-            f"  Con imágenes válidas:    {self.with_valid_images:>6}",
-            f"  Con inventario:          {self.with_valid_inventory:>6}",
-            "-" * 60,
-            f"  Enviados (Online):       {self.sent_online:>6}",
-            f"  Enviados (Local):        {self.sent_local:>6}",
-            "=" * 60,
-            ""
-        ]
-        return "\n".join(lines)
+        return f"""
+{_SEP60}
+{'ESTADÍSTICAS DEL PIPELINE':^60}
+{_SEP60}
+  Total procesados:        {self.total_processed:>6}
+  Válidos:                 {self.total_valid:>6}
+  Inválidos:               {self.total_invalid:>6}
+  Errores:                 {self.total_errors:>6}
+{_DASH60}
+  Con precios válidos:     {self.with_valid_prices:>6}
+  Con imágenes válidas:    {self.with_valid_images:>6}
+  Con inventario:          {self.with_valid_inventory:>6}
+{_DASH60}
+  Enviados (Online):       {self.sent_online:>6}
+  Enviados (Local):        {self.sent_local:>6}
+{_SEP60}
+"""
     
     def log_report(self):
         """Registra el reporte en los logs."""
@@ -532,6 +855,7 @@ if __name__ == '__main__':
     final = processor.flush()
     if final:
         print(f"Lote final: {final}")
+    print(f"Chunks: {list(BatchProcessor.chunks(range(7), 3))}")
     
     # Test PipelineStats
     stats = PipelineStats()